@@ -0,0 +1,214 @@
+"""
+Benchmarks for pairing, membership changes and project creation.
+
+Synthetic projects are generated for every participant count with a
+given number of past rounds and share of removed participants, and
+every operation is timed on a fresh copy. Results are written as JSON
+so that runs of different versions can be compared:
+
+    python benchmarks/bench_roulette.py --sizes 50 200 1000 --history 10
+    python benchmarks/bench_roulette.py --compare old.json new.json
+"""
+import argparse
+import contextlib
+import datetime as dt
+import json
+import logging
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+import coffee_roulette as cr  # noqa: E402
+from coffee_roulette.session import Roulette  # noqa: E402
+
+DEFAULT_SIZES = [50, 200, 1000, 5000, 20000]
+
+
+def make_project(working_dir, n, history=0, removed_ratio=0.0, seed=0):
+    """
+    Creates a synthetic roulette of n participants that has already
+    run history rounds and from which a share removed_ratio of
+    participants has been removed
+
+    RETURNS
+    -------------
+        cfg_path : Path
+    """
+    rng = np.random.default_rng(seed)
+    with _quiet():
+        cr.create_coffee_roulette(
+            "bench",
+            working_dir=working_dir,
+            participants=[f"person{i}" for i in range(n)],
+        )
+    cfg_path = Path(working_dir) / "CoffeeRoulette-bench" / "config.yaml"
+
+    roulette = Roulette(cfg_path)
+    for _ in range(history):
+        order = rng.permutation(n - n % 2)
+        roulette.met.mark_met(order[0::2], order[1::2])
+    roulette.mark_dirty("met")
+    roulette.commit()
+
+    removed = rng.choice(n, size=int(n * removed_ratio), replace=False)
+    if removed.shape[0] > 0:
+        with _quiet():
+            cr.remove_participants(
+                roulette, [f"person{i}" for i in sorted(removed)]
+            )
+    return cfg_path
+
+
+def measure(func, *args, **kwargs):
+    """
+    Runs func once and returns its wall time and peak traced memory,
+    merged with the RunStats it returns
+    """
+    tracemalloc.start()
+    start = time.perf_counter()
+    with _quiet():
+        stats = func(*args, **kwargs)
+    wall = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    result = {"wall_s": wall, "peak_mb": peak / 2**20}
+    if stats is not None:
+        result.update(stats.as_dict())
+        del result["operation"]
+    return result
+
+
+def bench_size(n, history, removed_ratio, add_ratio, seed):
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        names = [f"person{i}" for i in range(n)]
+        results["create_coffee_roulette"] = measure(
+            cr.create_coffee_roulette,
+            "bench",
+            working_dir=tmp,
+            participants=names,
+        )
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cfg_path = make_project(tmp, n, history, removed_ratio, seed)
+        template = Path(tmp) / "template"
+        shutil.copytree(cfg_path.parent, template)
+
+        def fresh():
+            shutil.rmtree(cfg_path.parent)
+            shutil.copytree(template, cfg_path.parent)
+            return cfg_path
+
+        results["get_pairs"] = measure(cr.get_pairs, fresh(), seed=seed)
+
+        new_names = [f"new{i}" for i in range(max(1, int(n * add_ratio)))]
+        results["add_participants"] = measure(
+            cr.add_participants, fresh(), new_names
+        )
+
+        removed_names = names[: max(1, int(n * add_ratio))]
+        results["remove_participants"] = measure(
+            cr.remove_participants, fresh(), removed_names
+        )
+    return results
+
+
+def compare(old_path, new_path):
+    """
+    Prints the ratio of new to old wall times for every benchmark
+    """
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    for size, operations in new["results"].items():
+        for operation, stats in operations.items():
+            before = old["results"].get(size, {}).get(operation)
+            if before is None:
+                continue
+            ratio = stats["wall_s"] / before["wall_s"]
+            print(
+                f"N={size:>6} {operation:<24} {before['wall_s']:9.4f}s -> {stats['wall_s']:9.4f}s ({ratio:.2f}x)"
+            )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument(
+        "--history", type=int, default=5, help="past rounds per project"
+    )
+    parser.add_argument(
+        "--removed", type=float, default=0.1, help="share of removed people"
+    )
+    parser.add_argument(
+        "--added", type=float, default=0.1, help="share of people to add"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument(
+        "--compare", nargs=2, metavar=("OLD", "NEW"), help="compare two runs"
+    )
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    report = {
+        "metadata": {
+            "version": cr.__version__,
+            "commit": _git_commit(),
+            "date": dt.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "history": args.history,
+            "removed_ratio": args.removed,
+            "added_ratio": args.added,
+            "seed": args.seed,
+        },
+        "results": {},
+    }
+    for n in args.sizes:
+        print(f"Benchmarking N={n}...", file=sys.stderr)
+        report["results"][str(n)] = bench_size(
+            n, args.history, args.removed, args.added, args.seed
+        )
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    print(json.dumps(report["results"], indent=2))
+
+
+@contextlib.contextmanager
+def _quiet():
+    package_logger = logging.getLogger("coffee_roulette")
+    level = package_logger.level
+    package_logger.setLevel(logging.ERROR)
+    try:
+        yield
+    finally:
+        package_logger.setLevel(level)
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            cwd=Path(__file__).resolve().parent,
+        ).stdout.strip()
+    except OSError:
+        return None
+
+
+if __name__ == "__main__":
+    main()
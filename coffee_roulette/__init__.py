@@ -2,6 +2,86 @@ __author__ = "Zane Mitrevica"
 __license__ = "BSD-3-Clause"
 __version__ = "0.4.7"
 
-from .create import *
-from .modify import *
-from .get_pairs import *
+import importlib
+from typing import TYPE_CHECKING
+
+# public name -> module defining it; modules (and with them numpy) are
+# only imported when one of their names is first used, which keeps the
+# command-line entry point quick to start
+_API = {
+    "create_coffee_roulette": "create",
+    "add_participants": "modify",
+    "remove_participants": "modify",
+    "print_participants": "modify",
+    "get_pairs": "get_pairs",
+    "Roulette": "session",
+    "open_roulette": "session",
+    "precompute_schedule": "schedule",
+    "run_roulettes": "batch",
+    "last_meeting": "history",
+    "meeting_log": "history",
+    "round_pairings": "history",
+    "sitout_counts": "history",
+    "import_results": "history",
+    "compact_roulette": "compact",
+    "current_id": "compact",
+    "simulate_roulette": "simulate",
+    "sweep_team_sizes": "simulate",
+    "set_labels": "constraints",
+    "RunStats": "stats",
+    "ConflictError": "locking",
+    "MetMatrix": "metmatrix",
+    "SparseMetMatrix": "metmatrix",
+    "match_round": "matching",
+    "register_engine": "matching",
+    "get_backend": "backends",
+    "migrate_to_sqlite": "backends",
+    "edit_config": "utils",
+    "read_config": "utils",
+}
+
+
+__all__ = list(_API)
+
+if TYPE_CHECKING:
+    from .create import create_coffee_roulette
+    from .modify import (
+        add_participants,
+        remove_participants,
+        print_participants,
+    )
+    from .get_pairs import get_pairs
+    from .session import Roulette, open_roulette
+    from .schedule import precompute_schedule
+    from .batch import run_roulettes
+    from .history import (
+        last_meeting,
+        meeting_log,
+        round_pairings,
+        sitout_counts,
+        import_results,
+    )
+    from .compact import compact_roulette, current_id
+    from .simulate import simulate_roulette, sweep_team_sizes
+    from .constraints import set_labels
+    from .stats import RunStats
+    from .locking import ConflictError
+    from .metmatrix import MetMatrix, SparseMetMatrix
+    from .matching import match_round, register_engine
+    from .backends import get_backend, migrate_to_sqlite
+    from .utils import edit_config, read_config
+
+
+def __getattr__(name):
+    if name not in _API:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    module = importlib.import_module(f"{__name__}.{_API[name]}")
+    value = getattr(module, name)
+    # cached so later lookups skip this function; this also restores
+    # get_pairs, which importing the submodule of that name replaced
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_API))
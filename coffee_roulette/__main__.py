@@ -0,0 +1,4 @@
+import sys
+from coffee_roulette.cli import main
+
+sys.exit(main())
@@ -0,0 +1,447 @@
+import os
+import json
+import pickle
+import sqlite3
+import numpy as np
+from coffee_roulette.locking import atomic_write
+from coffee_roulette.metmatrix import (
+    MetMatrix,
+    SparseMetMatrix,
+    load_met_matrix,
+    MET_MATRIX_FILE,
+    MET_PAIRS_FILE,
+)
+from coffee_roulette.labels import Labels, LABELS_FILE
+
+PARTICIPANT_FILE = "crParticipantDict.p"
+REMOVED_PARTICIPANT_FILE = "crRemovedParticipantDict.pkl"
+CONV_STARTER_FILE = "crConversationStarters.txt"
+SCHEDULE_FILE = "crSchedule.json"
+DATABASE_FILE = "crRoulette.db"
+
+
+class FileBackend:
+    """
+    Stores every component of a roulette in its own file:
+    crMetMatrix.npy, crParticipantDict.p and crRemovedParticipantDict.pkl.
+
+    Saving a component rewrites its whole file, through a temporary
+    file that replaces it once complete. io counts the bytes
+    read and written. With met_storage="sparse" the met pairs are kept
+    as a SparseMetMatrix in crMetPairs.npz instead.
+    """
+
+    name = "files"
+    file_names = {
+        "met": MET_MATRIX_FILE,
+        "participants": PARTICIPANT_FILE,
+        "removed": REMOVED_PARTICIPANT_FILE,
+        "starters": CONV_STARTER_FILE,
+        "schedule": SCHEDULE_FILE,
+        "labels": LABELS_FILE,
+    }
+
+    def __init__(self, roulette_dir, met_storage="dense"):
+        self.roulette_dir = roulette_dir
+        self.met_storage = met_storage
+        self.io = {"bytes_read": 0, "bytes_written": 0}
+
+    def path(self, component):
+        if component == "met" and self.met_storage == "sparse":
+            return self.roulette_dir / MET_PAIRS_FILE
+        return self.roulette_dir / self.file_names[component]
+
+    def stamp(self, component):
+        """
+        Changes whenever the stored component changes
+        """
+        return _file_stamp(self.path(component))
+
+    def load(self, component):
+        path = self.path(component)
+        if component == "met":
+            value = load_met_matrix(
+                self.roulette_dir, storage=self.met_storage
+            )
+        elif component == "starters":
+            value = _load_starters(path)
+        elif component == "schedule":
+            value = _load_schedule(path)
+        elif component == "labels":
+            value = Labels.load(path)
+        elif component == "removed" and not os.path.exists(path):
+            value = {}
+        else:
+            with open(path, "rb") as f:
+                value = pickle.load(f)
+        self.io["bytes_read"] += _file_size(path)
+        return value
+
+    def save(self, components):
+        """
+        Writes components, a dictionary of component name -> value
+        """
+        for component, value in components.items():
+            path = self.path(component)
+            if component in ("met", "labels"):
+                value.save(path)
+                if component == "met":
+                    value.clear_new_pairs()
+            elif component == "schedule":
+                _save_schedule(path, value)
+            else:
+                with atomic_write(path) as f:
+                    pickle.dump(value, f)
+            self.io["bytes_written"] += _file_size(path)
+
+    def close(self):
+        pass
+
+
+class SQLiteBackend:
+    """
+    Stores participants, met pairs, removed participants and the
+    conversation starter history in a SQLite database (crRoulette.db).
+
+    Only rows that changed since the components were loaded are
+    written, all in a single transaction, so saving a round costs
+    O(N) rather than rewriting an N x N matrix. Conversation starters
+    themselves stay in crConversationStarters.txt, a precomputed
+    schedule in crSchedule.json and participant labels in
+    crLabels.npz. io counts the database rows read and
+    written and the bytes of the other files. With met_storage="sparse"
+    the met pairs are loaded into a SparseMetMatrix.
+    """
+
+    name = "sqlite"
+    schema = """
+    CREATE TABLE IF NOT EXISTS meta (
+        key TEXT PRIMARY KEY,
+        value INTEGER NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS participants (
+        id INTEGER PRIMARY KEY,
+        name TEXT NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS participants_name ON participants (name);
+    CREATE TABLE IF NOT EXISTS removed (
+        id INTEGER PRIMARY KEY,
+        name TEXT NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS met_pairs (
+        a INTEGER NOT NULL,
+        b INTEGER NOT NULL,
+        PRIMARY KEY (a, b)
+    ) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS met_pairs_b ON met_pairs (b);
+    CREATE TABLE IF NOT EXISTS starter_history (
+        participant INTEGER NOT NULL,
+        position INTEGER NOT NULL,
+        starter INTEGER NOT NULL,
+        PRIMARY KEY (participant, position)
+    ) WITHOUT ROWID;
+    """
+
+    def __init__(self, roulette_dir, met_storage="dense"):
+        self.roulette_dir = roulette_dir
+        self.met_storage = met_storage
+        # sessions may be used from several threads, one at a time (see
+        # coffee_roulette.service)
+        self.connection = sqlite3.connect(
+            roulette_dir / DATABASE_FILE, check_same_thread=False
+        )
+        self.connection.executescript(self.schema)
+        # what the database held when each component was loaded or saved
+        self._loaded = {}
+        self._snapshot = {}
+        self.io = {
+            "rows_read": 0,
+            "rows_written": 0,
+            "bytes_read": 0,
+            "bytes_written": 0,
+        }
+
+    def stamp(self, component):
+        """
+        Changes whenever the stored component changes
+        """
+        if component == "starters":
+            return _file_stamp(self.roulette_dir / CONV_STARTER_FILE)
+        if component == "schedule":
+            return _file_stamp(self.roulette_dir / SCHEDULE_FILE)
+        if component == "labels":
+            return _file_stamp(self.roulette_dir / LABELS_FILE)
+        return self._meta(f"version:{component}")
+
+    def load(self, component):
+        if component in ("starters", "schedule"):
+            path = self.roulette_dir / (
+                CONV_STARTER_FILE if component == "starters" else SCHEDULE_FILE
+            )
+            self.io["bytes_read"] += _file_size(path)
+            if component == "starters":
+                return _load_starters(path)
+            return _load_schedule(path)
+        if component == "labels":
+            path = self.roulette_dir / LABELS_FILE
+            self.io["bytes_read"] += _file_size(path)
+            return Labels.load(path)
+
+        if component == "met":
+            if self.met_storage == "sparse":
+                met = SparseMetMatrix.empty(self._meta("size"))
+            else:
+                met = MetMatrix.empty(self._meta("size"))
+            pairs = np.asarray(
+                self.connection.execute(
+                    "SELECT a, b FROM met_pairs"
+                ).fetchall(),
+                dtype=np.intp,
+            ).reshape(-1, 2)
+            met.mark_met(pairs[:, 0], pairs[:, 1])
+            met.clear_new_pairs()
+            self.io["rows_read"] += pairs.shape[0]
+            value = met
+        elif component == "participants":
+            history = self._starter_history()
+            value = {
+                p_id: (name, history.get(p_id, []))
+                for p_id, name in self.connection.execute(
+                    "SELECT id, name FROM participants ORDER BY id"
+                )
+            }
+            self._snapshot[component] = _participant_snapshot(value)
+            self.io["rows_read"] += len(value)
+        elif component == "removed":
+            history = self._starter_history()
+            value = {
+                p_id: (name, history.get(p_id, []))
+                for p_id, name in self.connection.execute(
+                    "SELECT id, name FROM removed ORDER BY id"
+                )
+            }
+            self._snapshot[component] = set(value)
+            self.io["rows_read"] += len(value)
+        self._loaded[component] = value
+        return value
+
+    def save(self, components):
+        """
+        Writes components, a dictionary of component name -> value,
+        in one transaction
+        """
+        components = dict(components)
+        if "schedule" in components:
+            path = self.roulette_dir / SCHEDULE_FILE
+            _save_schedule(path, components.pop("schedule"))
+            self.io["bytes_written"] += _file_size(path)
+        if "labels" in components:
+            path = self.roulette_dir / LABELS_FILE
+            components.pop("labels").save(path)
+            self.io["bytes_written"] += _file_size(path)
+        changes = self.connection.total_changes
+        with self.connection:
+            for component, value in components.items():
+                getattr(self, f"_save_{component}")(value)
+                self._bump(f"version:{component}")
+                self._loaded[component] = value
+        self.io["rows_written"] += self.connection.total_changes - changes
+
+    def close(self):
+        self.connection.close()
+
+    def _save_met(self, met):
+        if met is self._loaded.get("met"):
+            i, j = met.new_pairs()
+        else:
+            # a different matrix: store it in full
+            self.connection.execute("DELETE FROM met_pairs")
+            i, j = met.pairs()
+        self.connection.executemany(
+            "INSERT OR IGNORE INTO met_pairs (a, b) VALUES (?, ?)",
+            zip(np.minimum(i, j).tolist(), np.maximum(i, j).tolist()),
+        )
+        met.clear_new_pairs()
+        self._set_meta("size", met.n)
+
+    def _save_participants(self, participants):
+        previous = self._snapshot.get("participants", {})
+        if participants is not self._loaded.get("participants"):
+            previous = {}
+            self.connection.execute("DELETE FROM participants")
+            self.connection.execute("DELETE FROM starter_history")
+
+        for p_id, (name, history) in participants.items():
+            p_id = int(p_id)
+            old_name, old_length = previous.get(p_id, (None, 0))
+            if name != old_name:
+                self.connection.execute(
+                    "INSERT OR REPLACE INTO participants (id, name) VALUES (?, ?)",
+                    (p_id, name),
+                )
+            if len(history) > old_length:
+                self.connection.executemany(
+                    "INSERT OR REPLACE INTO starter_history (participant, position, starter) VALUES (?, ?, ?)",
+                    (
+                        (p_id, position, int(starter))
+                        for position, starter in enumerate(
+                            history[old_length:], start=old_length
+                        )
+                    ),
+                )
+        gone = set(previous) - set(int(p_id) for p_id in participants)
+        self.connection.executemany(
+            "DELETE FROM participants WHERE id = ?", ((p,) for p in gone)
+        )
+        self.connection.executemany(
+            "DELETE FROM starter_history WHERE participant = ?",
+            ((p,) for p in gone),
+        )
+        self._snapshot["participants"] = _participant_snapshot(participants)
+
+    def _save_removed(self, removed):
+        previous = self._snapshot.get("removed", set())
+        if removed is not self._loaded.get("removed"):
+            previous = set()
+            self.connection.execute("DELETE FROM removed")
+        current = set(int(p_id) for p_id in removed)
+        self.connection.executemany(
+            "INSERT OR REPLACE INTO removed (id, name) VALUES (?, ?)",
+            ((p_id, removed[p_id][0]) for p_id in current - previous),
+        )
+        self.connection.executemany(
+            "DELETE FROM removed WHERE id = ?",
+            ((p_id,) for p_id in previous - current),
+        )
+        self._snapshot["removed"] = current
+
+    def _starter_history(self):
+        history = {}
+        for p_id, starter in self.connection.execute(
+            "SELECT participant, starter FROM starter_history ORDER BY participant, position"
+        ):
+            history.setdefault(p_id, []).append(starter)
+            self.io["rows_read"] += 1
+        return history
+
+    def _meta(self, key):
+        row = self.connection.execute(
+            "SELECT value FROM meta WHERE key = ?", (key,)
+        ).fetchone()
+        return 0 if row is None else row[0]
+
+    def _set_meta(self, key, value):
+        self.connection.execute(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+            (key, int(value)),
+        )
+
+    def _bump(self, key):
+        self._set_meta(key, self._meta(key) + 1)
+
+
+BACKENDS = {
+    "files": FileBackend,
+    "sqlite": SQLiteBackend,
+}
+
+
+def get_backend(name, roulette_dir, met_storage=None):
+    """
+    Opens the storage backend called name for a roulette directory.
+    met_storage is "dense" (default) or "sparse".
+    """
+    if met_storage is None:
+        met_storage = "dense"
+    if met_storage not in ("dense", "sparse"):
+        raise ValueError(
+            f"Unknown met storage '{met_storage}'! Choose 'dense' or 'sparse'"
+        )
+    if name is None:
+        name = "files"
+    if name not in BACKENDS:
+        raise ValueError(
+            f"Unknown storage backend '{name}'! Choose one of {list(BACKENDS)}"
+        )
+    return BACKENDS[name](roulette_dir, met_storage=met_storage)
+
+
+def migrate_to_sqlite(cfg_path):
+    """
+    Copies a roulette stored in files into a SQLite database and
+    switches its config to the SQLite backend.
+
+    The old crMetMatrix.npy (or crProbMatrix.npy) and pickle files are
+    no longer read afterwards and can be deleted.
+
+    PARAMETERS
+    -------------
+        cfg_path : string
+            Full path to the config.yaml file
+    """
+    from coffee_roulette.session import open_roulette
+
+    roulette = open_roulette(cfg_path)
+    with roulette.lock():
+        _migrate_to_sqlite(roulette)
+
+
+def _migrate_to_sqlite(roulette):
+    if roulette.backend.name == "sqlite":
+        raise ValueError("Roulette already uses the SQLite backend!")
+
+    backend = SQLiteBackend(roulette.roulette_dir)
+    backend.save(
+        {
+            "met": roulette.met,
+            "participants": roulette.participants,
+            "removed": roulette.removed,
+        }
+    )
+    backend.close()
+
+    roulette.config["storage_backend"] = "sqlite"
+    roulette.mark_dirty("config")
+    roulette.commit()
+
+
+def _load_starters(path):
+    with open(path, "r") as f:
+        return f.readlines()
+
+
+def _load_schedule(path):
+    if not os.path.exists(path):
+        return []
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def _save_schedule(path, schedule):
+    with atomic_write(path, "w") as f:
+        json.dump(schedule, f)
+
+
+def _participant_snapshot(participants):
+    return {
+        int(p_id): (name, len(history))
+        for p_id, (name, history) in participants.items()
+    }
+
+
+def _file_size(path):
+    try:
+        return os.stat(path).st_size
+    except FileNotFoundError:
+        return 0
+
+
+def _file_stamp(path):
+    """
+    Modification time and size of a file, or None if it does not exist
+    """
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
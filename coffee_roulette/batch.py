@@ -0,0 +1,107 @@
+import io
+import time
+import logging
+import traceback
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def run_roulettes(
+    cfg_paths=None, root=None, workers=None, seed=None, **kwargs
+):
+    """
+    Runs a round of several roulettes in parallel worker processes.
+
+    Every roulette gets an independent random stream spawned from seed.
+    A roulette that fails is reported in the summary and does not stop
+    the others. The messages each roulette logs (INFO and above) are
+    collected in its result.
+
+    PARAMETERS
+    -------------
+        cfg_paths : list of strings, optional
+            Full paths to config.yaml files
+        root : string, optional
+            Directory scanned for CoffeeRoulette-*/config.yaml files
+            (in addition to cfg_paths)
+        workers : int, optional
+            Number of worker processes
+            Defaults to the number of CPUs
+        seed : int, optional
+            Seed from which the streams of all roulettes are derived
+        kwargs
+            Passed on to get_pairs()
+
+    RETURNS
+    -------------
+        results : list of dicts
+            One per roulette, in input order, with keys "cfg_path",
+            "ok", "error" (traceback or None), "output" (logged text),
+            "duration" (seconds) and "stats" (RunStats.as_dict())
+    """
+    cfg_paths = [Path(p) for p in (cfg_paths or [])]
+    if root != None:
+        cfg_paths += sorted(Path(root).glob("CoffeeRoulette-*/config.yaml"))
+
+    seeds = np.random.SeedSequence(seed).spawn(len(cfg_paths))
+    results = [None] * len(cfg_paths)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(_run_roulette, str(cfg_path), seq, kwargs)
+            for cfg_path, seq in zip(cfg_paths, seeds)
+        ]
+        for k, future in enumerate(futures):
+            try:
+                results[k] = future.result()
+            except Exception:
+                # the worker itself died
+                results[k] = {
+                    "cfg_path": str(cfg_paths[k]),
+                    "ok": False,
+                    "error": traceback.format_exc(),
+                    "output": "",
+                    "duration": None,
+                    "stats": None,
+                }
+
+    failed = [r for r in results if not r["ok"]]
+    logger.info(
+        f"Ran {len(results)} roulette(s): {len(results) - len(failed)} succeeded, {len(failed)} failed."
+    )
+    for r in failed:
+        logger.error(
+            f"- {r['cfg_path']}: {r['error'].strip().splitlines()[-1]}"
+        )
+    return results
+
+
+def _run_roulette(cfg_path, seed_sequence, kwargs):
+    from coffee_roulette import get_pairs
+
+    output = io.StringIO()
+    handler = logging.StreamHandler(output)
+    package_logger = logging.getLogger("coffee_roulette")
+    package_logger.addHandler(handler)
+    package_logger.setLevel(logging.INFO)
+    start = time.perf_counter()
+    error = None
+    stats = None
+    try:
+        stats = get_pairs(
+            cfg_path, seed=np.random.default_rng(seed_sequence), **kwargs
+        ).as_dict()
+    except Exception:
+        error = traceback.format_exc()
+    finally:
+        package_logger.removeHandler(handler)
+    return {
+        "cfg_path": cfg_path,
+        "ok": error is None,
+        "error": error,
+        "output": output.getvalue(),
+        "duration": time.perf_counter() - start,
+        "stats": stats,
+    }
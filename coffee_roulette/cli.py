@@ -0,0 +1,202 @@
+"""
+Command-line interface:
+
+    coffee-roulette create NAME --participants Ada Alan Grace
+    coffee-roulette pairs path/to/config.yaml
+    coffee-roulette add path/to/config.yaml Barbara
+    coffee-roulette remove path/to/config.yaml Alan
+    coffee-roulette list path/to/config.yaml
+    coffee-roulette serve --root path/to/roulettes
+
+Names can also be read from a file with one name per line (-f FILE, or
+-f - for standard input). Nothing is ever prompted for, so the command
+is safe to call from cron jobs and chat bots. Each subcommand imports
+only the modules it needs.
+"""
+import sys
+import logging
+import argparse
+
+logger = logging.getLogger("coffee_roulette")
+
+
+def main(argv=None):
+    parser = _parser()
+    args = parser.parse_args(argv)
+    # the output of a command (e.g. the pairs) goes to stdout and
+    # warnings and errors to stderr
+    output = logging.StreamHandler(sys.stdout)
+    output.addFilter(lambda record: record.levelno < logging.WARNING)
+    errors = logging.StreamHandler(sys.stderr)
+    errors.setLevel(logging.WARNING)
+    logging.basicConfig(
+        format="%(message)s",
+        level=logging.WARNING if args.quiet else logging.INFO,
+        handlers=[output, errors],
+    )
+    try:
+        args.func(args)
+    except (ValueError, FileNotFoundError) as e:
+        logger.error(f"Error: {e}")
+        return 1
+    return 0
+
+
+def create(args):
+    from coffee_roulette.create import create_coffee_roulette
+
+    create_coffee_roulette(
+        args.name,
+        working_dir=args.dir,
+        participants=_names(args),
+        storage_backend=args.storage_backend,
+        met_storage=args.met_storage,
+        interactive=False,
+    )
+
+
+def pairs(args):
+    from coffee_roulette import get_pairs
+
+    exclude = args.exclude
+    if exclude != None and exclude.isdigit():
+        exclude = int(exclude)
+    get_pairs(
+        args.cfg_path,
+        conv_starters=not args.no_starters,
+        random_time=not args.no_time,
+        exclude_nonrandom=exclude,
+        engine=args.engine,
+        seed=args.seed,
+        use_schedule=not args.no_schedule,
+        spread_times=args.spread_times,
+        recycle=args.recycle,
+    )
+
+
+def add(args):
+    from coffee_roulette.modify import add_participants
+
+    add_participants(args.cfg_path, _names(args))
+
+
+def remove(args):
+    from coffee_roulette.modify import remove_participants
+
+    remove_participants(args.cfg_path, _names(args))
+
+
+def list_participants(args):
+    from coffee_roulette.modify import print_participants
+
+    print_participants(args.cfg_path)
+
+
+def serve(args):
+    from coffee_roulette.service import serve
+
+    serve(
+        cfg_paths=args.cfg_paths,
+        root=args.root,
+        host=args.host,
+        port=args.port,
+        path=args.socket,
+    )
+
+
+def _names(args):
+    names = list(args.names)
+    if args.file == "-":
+        names += _read_names(sys.stdin)
+    elif args.file != None:
+        with open(args.file) as f:
+            names += _read_names(f)
+    return names
+
+
+def _read_names(f):
+    return [line.strip() for line in f if line.strip()]
+
+
+def _parser():
+    from coffee_roulette import __version__
+
+    parser = argparse.ArgumentParser(
+        prog="coffee-roulette", description="Pseudo-random pair generator"
+    )
+    parser.add_argument(
+        "--version", action="version", version=f"%(prog)s {__version__}"
+    )
+    parser.add_argument(
+        "-q", "--quiet", action="store_true", help="only log warnings"
+    )
+    subparsers = parser.add_subparsers(required=True, metavar="command")
+
+    def names_arguments(p):
+        p.add_argument("names", nargs="*", help="participant names")
+        p.add_argument(
+            "-f", "--file", help="file with one name per line (- for stdin)"
+        )
+
+    p = subparsers.add_parser("create", help="create a new roulette")
+    p.add_argument("name", help="roulette name")
+    p.add_argument("--dir", help="working directory (default: .)")
+    p.add_argument(
+        "--participants", dest="names", nargs="*", default=[], metavar="NAME"
+    )
+    p.add_argument(
+        "-f", "--file", help="file with one name per line (- for stdin)"
+    )
+    p.add_argument(
+        "--storage-backend", default="files", choices=["files", "sqlite"]
+    )
+    p.add_argument(
+        "--met-storage", default="dense", choices=["dense", "sparse"]
+    )
+    p.set_defaults(func=create)
+
+    p = subparsers.add_parser("pairs", help="draw the next round of pairs")
+    p.add_argument("cfg_path", help="path to config.yaml")
+    p.add_argument("--no-starters", action="store_true")
+    p.add_argument("--no-time", action="store_true")
+    p.add_argument(
+        "--exclude", help="id or name of the person to sit out if odd"
+    )
+    p.add_argument("--engine", help="matching engine")
+    p.add_argument("--seed", type=int)
+    p.add_argument("--no-schedule", action="store_true")
+    p.add_argument("--spread-times", action="store_true")
+    p.add_argument(
+        "--recycle",
+        default="stalest",
+        choices=["stalest", "random"],
+        help="how to choose repeats once unique pairs run out",
+    )
+    p.set_defaults(func=pairs)
+
+    p = subparsers.add_parser("add", help="add participants")
+    p.add_argument("cfg_path", help="path to config.yaml")
+    names_arguments(p)
+    p.set_defaults(func=add)
+
+    p = subparsers.add_parser("remove", help="remove participants")
+    p.add_argument("cfg_path", help="path to config.yaml")
+    names_arguments(p)
+    p.set_defaults(func=remove)
+
+    p = subparsers.add_parser("list", help="list participants")
+    p.add_argument("cfg_path", help="path to config.yaml")
+    p.set_defaults(func=list_participants)
+
+    p = subparsers.add_parser("serve", help="serve roulettes over local HTTP")
+    p.add_argument("cfg_paths", nargs="*", help="paths to config.yaml")
+    p.add_argument("--root", help="directory with CoffeeRoulette-* projects")
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=8765)
+    p.add_argument("--socket", help="serve on this Unix socket instead")
+    p.set_defaults(func=serve)
+    return parser
+
+
+if __name__ == "__main__":
+    sys.exit(main())
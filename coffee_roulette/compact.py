@@ -0,0 +1,182 @@
+import os
+import json
+import logging
+import datetime as dt
+import numpy as np
+from coffee_roulette.session import open_roulette, locked
+from coffee_roulette.locking import atomic_write
+from coffee_roulette.history import MeetingHistory
+from coffee_roulette.stats import RunStats
+
+logger = logging.getLogger(__name__)
+
+ID_MAP_FILE = "crIdMap.json"
+
+
+@locked()
+def compact_roulette(cfg_path, on_stats=None):
+    """
+    Drops removed participants from all stored data and renumbers the
+    remaining participants 0..N-1.
+
+    The met matrix, the participant dictionary, the precomputed
+    schedule, the participant labels and the meeting history are all rewritten with the new
+    ids; the removed-participant dictionary is emptied. Participants
+    keep their order. In the meeting history, the retired participants
+    are kept under negative ids so their past meetings stay queryable.
+    Every compaction is appended to crIdMap.json as a list of
+    [old id, new id] pairs, see current_id().
+
+    Runs automatically after remove_participants() once the share of
+    removed participants reaches the config's compact_threshold.
+
+    PARAMETERS
+    -------------
+        cfg_path : string or Roulette
+            Full path to the config.yaml file or an open Roulette session
+        on_stats : callable, optional
+            Called with the RunStats of the operation
+
+    RETURNS
+    -------------
+        stats : RunStats
+            Timings of the "load", "remap" and "save" phases
+    """
+    stats = RunStats("compact_roulette")
+    roulette = open_roulette(cfg_path)
+    with stats.phase("load"), stats.track_io(roulette):
+        crMetMatrix = roulette.met
+        crParticipantDict = roulette.participants
+        crRemovedParticipantDict = roulette.removed
+        schedule = roulette.schedule
+        labels = roulette.labels
+
+    with stats.phase("remap"):
+        kept = np.setdiff1d(
+            np.arange(crMetMatrix.n), list(crRemovedParticipantDict)
+        )
+        new_ids = np.full(crMetMatrix.n, -1)
+        new_ids[kept] = np.arange(kept.shape[0])
+
+        i, j = crMetMatrix.pairs()
+        keep = (new_ids[i] >= 0) & (new_ids[j] >= 0)
+        compacted = type(crMetMatrix).empty(kept.shape[0])
+        compacted.mark_met(new_ids[i[keep]], new_ids[j[keep]])
+
+        participants = {
+            int(new_ids[p_id]): value
+            for p_id, value in crParticipantDict.items()
+            if new_ids[p_id] >= 0
+        }
+        remapped_schedule = [
+            {
+                "pairs": [
+                    [int(new_ids[a]), int(new_ids[b])]
+                    for a, b in scheduled_round["pairs"]
+                    if new_ids[a] >= 0 and new_ids[b] >= 0
+                ],
+                "sitout": _remap(new_ids, scheduled_round["sitout"]),
+            }
+            for scheduled_round in schedule
+        ]
+
+    with stats.phase("save"), stats.track_io(roulette):
+        roulette.met = compacted
+        roulette.participants = participants
+        roulette.removed = {}
+        if schedule:
+            roulette.schedule = remapped_schedule
+        if labels.codes:
+            roulette.labels = labels.remap(new_ids, compacted.n)
+        roulette.commit()
+
+        id_map = {int(p_id): int(new_ids[p_id]) for p_id in kept}
+        retired_names = {
+            int(p_id): crParticipantDict[p_id][0]
+            for p_id in crRemovedParticipantDict
+            if p_id in crParticipantDict
+        }
+        with MeetingHistory(roulette.roulette_dir) as history:
+            id_map = history.renumber(id_map, retired_names)
+        _append_id_map(roulette.roulette_dir, id_map)
+
+    logger.info(
+        f"Compacted the roulette from {crMetMatrix.n} to {compacted.n} participants."
+    )
+    stats.counters.update(
+        retired=crMetMatrix.n - compacted.n, matrix_size=compacted.n
+    )
+    return stats.finish(on_stats)
+
+
+def compact_if_needed(roulette):
+    """
+    Runs compact_roulette() if the share of removed participants has
+    reached config["compact_threshold"] (if set)
+
+    RETURNS
+    -------------
+        stats : RunStats or None if nothing was done
+    """
+    threshold = roulette.config.get("compact_threshold")
+    n = roulette.met.n
+    if threshold == None or n == 0 or len(roulette.removed) / n < threshold:
+        return None
+    return compact_roulette(roulette)
+
+
+def current_id(cfg_path, old_id, compaction=0):
+    """
+    Translates a participant id from before a compaction into the
+    current id
+
+    PARAMETERS
+    -------------
+        cfg_path : string or Roulette
+            Full path to the config.yaml file or an open Roulette session
+        old_id : int
+        compaction : int, optional
+            Number of compactions that had already run when old_id
+            was valid
+            Defaults to 0 (an id from before the first compaction)
+
+    RETURNS
+    -------------
+        p_id : int
+            Current id; negative ids refer to retired participants in
+            the meeting history
+    """
+    roulette = open_roulette(cfg_path)
+    for compaction_record in _load_id_map(roulette.roulette_dir)[compaction:]:
+        id_map = dict(compaction_record["map"])
+        if old_id not in id_map:
+            # retired before, so negative and unchanged
+            continue
+        old_id = id_map[old_id]
+    return old_id
+
+
+def _remap(new_ids, p_id):
+    if p_id == None or new_ids[p_id] < 0:
+        return None
+    return int(new_ids[p_id])
+
+
+def _load_id_map(roulette_dir):
+    path = roulette_dir / ID_MAP_FILE
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return json.load(f)
+
+
+def _append_id_map(roulette_dir, id_map):
+    compactions = _load_id_map(roulette_dir)
+    compactions.append(
+        {
+            "date": dt.datetime.today().isoformat(timespec="seconds"),
+            "map": sorted(id_map.items()),
+        }
+    )
+    with atomic_write(roulette_dir / ID_MAP_FILE, "w") as f:
+        json.dump(compactions, f)
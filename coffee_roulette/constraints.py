@@ -0,0 +1,179 @@
+"""
+Pairing constraints declared on participant attributes.
+
+Rules are listed in the config, each naming an attribute set with
+set_labels() (or add_participants(..., labels=...)):
+
+    pairing_constraints:
+      - different: team      # never pair two people of the same team
+      - same: site           # only pair people of the same site
+      - not_with: manager    # never pair someone with the person named
+                             # in their manager attribute
+
+Participants without a value for an attribute are not restricted by its
+rules. The rules are evaluated on the label vectors while a round is
+drawn and combined with the met matrix; nothing is stored per pair. If
+no complete round satisfies them, the participants left over are still
+paired and reported as repeats.
+"""
+import logging
+import numpy as np
+from coffee_roulette.session import open_roulette, locked
+from coffee_roulette.stats import RunStats
+
+logger = logging.getLogger(__name__)
+
+RULES = ("different", "same", "not_with")
+
+
+class PairingConstraints:
+    """
+    Tests pairs of participant ids against the configured rules
+
+    PARAMETERS
+    -------------
+        rules : list of dicts
+            config["pairing_constraints"], e.g. [{"different": "team"}]
+        labels : Labels
+        name_index : NameIndex, optional
+            Needed by not_with rules to resolve names to ids
+    """
+
+    def __init__(self, rules, labels, name_index=None):
+        self.rules = []
+        for rule in rules:
+            for kind, attribute in dict(rule).items():
+                if kind not in RULES:
+                    raise ValueError(
+                        f"Unknown pairing constraint '{kind}'! Choose one of {list(RULES)}"
+                    )
+                self.rules.append((kind, str(attribute)))
+        self.labels = labels
+        self.name_index = name_index
+        self._targets = {}
+
+    @classmethod
+    def from_roulette(cls, roulette):
+        """
+        Constraints of a roulette, or None if its config sets none
+        """
+        rules = roulette.config.get("pairing_constraints")
+        if not rules:
+            return None
+        return cls(rules, roulette.labels, roulette.name_index)
+
+    def allowed(self, a, b):
+        """
+        Whether the pairs of ids (a[k], b[k]) may be drawn
+        """
+        a = np.asarray(a, dtype=np.intp)
+        b = np.asarray(b, dtype=np.intp)
+        ok = np.ones(np.broadcast(a, b).shape, dtype=bool)
+        for kind, attribute in self.rules:
+            if kind == "not_with":
+                ok &= self._target_of(attribute, a) != b
+                ok &= self._target_of(attribute, b) != a
+                continue
+            ca = self.labels.codes_of(attribute, a)
+            cb = self.labels.codes_of(attribute, b)
+            same = ca == cb
+            ok &= (
+                (ca < 0) | (cb < 0) | (~same if kind == "different" else same)
+            )
+        return ok
+
+    def allowed_submatrix(self, ids):
+        """
+        Boolean matrix of the pairs among ids that may be drawn
+        """
+        ids = np.asarray(ids, dtype=np.intp)
+        k = ids.shape[0]
+        allowed = np.ones((k, k), dtype=bool)
+        for kind, attribute in self.rules:
+            if kind == "not_with":
+                positions = {
+                    p_id: pos for pos, p_id in enumerate(ids.tolist())
+                }
+                targets = self._target_of(attribute, ids).tolist()
+                for i, target in enumerate(targets):
+                    j = positions.get(target)
+                    if j != None:
+                        allowed[i, j] = allowed[j, i] = False
+                continue
+            codes = self.labels.codes_of(attribute, ids)
+            unset = codes < 0
+            if kind == "different":
+                # distinct negative codes never compare equal
+                codes = np.where(unset, -1 - np.arange(k), codes)
+                allowed &= codes[:, None] != codes
+            else:
+                same = codes[:, None] == codes
+                same[unset] = True
+                same[:, unset] = True
+                allowed &= same
+        return allowed
+
+    def _target_of(self, attribute, p_ids):
+        # ids of the people named in attribute (-1 if unset or unknown)
+        categories = self.labels.categories.get(attribute, [])
+        targets = self._targets.get(attribute)
+        if targets is None or targets.shape[0] != len(categories) + 1:
+            found = [-1] * len(categories)
+            if self.name_index != None:
+                for k, name in enumerate(categories):
+                    ids, _ = self.name_index.lookup([name])
+                    found[k] = ids[0] if ids else -1
+            # the last entry serves unset labels (code -1)
+            targets = np.asarray(found + [-1], dtype=np.intp)
+            self._targets[attribute] = targets
+        return targets[self.labels.codes_of(attribute, p_ids)]
+
+
+@locked()
+def set_labels(cfg_path, attribute, labels, on_stats=None):
+    """
+    Sets an attribute (e.g. team, site, role, manager) of participants,
+    for use in config["pairing_constraints"]
+
+    PARAMETERS
+    -------------
+        cfg_path : string or Roulette
+            Full path to the config.yaml file or an open Roulette session
+        attribute : string
+        labels : dict
+            Participant name or id -> value (None clears it)
+            Names that match nobody are logged and skipped
+        on_stats : callable, optional
+            Called with the RunStats of the operation
+
+    RETURNS
+    -------------
+        stats : RunStats
+            Counters "labelled" and "unknown" (the entries that matched
+            nobody)
+    """
+    stats = RunStats("set_labels")
+    roulette = open_roulette(cfg_path)
+    with stats.phase("update"), stats.track_io(roulette):
+        p_ids, values, unknown = [], [], []
+        for participant, value in labels.items():
+            ids, missing = roulette.name_index.lookup(
+                [participant], roulette.removed
+            )
+            unknown += missing
+            if ids:
+                p_ids.append(ids[0])
+                values.append(value)
+        if unknown:
+            logger.warning(
+                f"{len(unknown)} participant(s) not found: {', '.join(map(str, unknown))}"
+            )
+        if p_ids:
+            roulette.labels.set(attribute, p_ids, values)
+            roulette.mark_dirty("labels")
+
+    with stats.phase("save"), stats.track_io(roulette):
+        roulette.commit()
+
+    stats.counters.update(labelled=len(p_ids), unknown=unknown)
+    return stats.finish(on_stats)
@@ -1,16 +1,27 @@
-import numpy as np
 import os
+import sys
+import logging
 from pathlib import Path
-import pickle
 import datetime as dt
 from coffee_roulette import utils
+from coffee_roulette.backends import get_backend, BACKENDS
+from coffee_roulette.metmatrix import MetMatrix, SparseMetMatrix
 
+logger = logging.getLogger(__name__)
 
-def create_coffee_roulette(roulette_name, working_dir=None, participants=None):
+
+def create_coffee_roulette(
+    roulette_name,
+    working_dir=None,
+    participants=None,
+    storage_backend="files",
+    met_storage="dense",
+    interactive=None,
+):
     """
     Creates a new coffee roulette project directory.
 
-    This involves files for storing a meeting probability matrix
+    This involves files for storing a bit matrix of who has met whom
     and a dictionary of participant names.
 
     This function only needs to be run once.
@@ -26,12 +37,26 @@ def create_coffee_roulette(roulette_name, working_dir=None, participants=None):
 
         participants : list, option
             Lists of participants.
-            If None, the user is prompted to enter names.
+            If None, the user is prompted to enter names
+            (see interactive).
+
+        storage_backend : string, optional
+            "files" (default) or "sqlite", see coffee_roulette.backends
+
+        met_storage : string, optional
+            "dense" (default, N x N bit matrix) or "sparse" (list of met
+            pairs, for roulettes with thousands of participants)
+
+        interactive : bool, optional
+            Whether to prompt for names if participants is None
+            Defaults to prompting only when run from a terminal;
+            otherwise the roulette starts without participants
 
     WRITES
     -------------
-    working_dir/crParticipantDict.pkl
-    working_dir/crProbMatrix.npy
+    working_dir/crParticipantDict.p
+    working_dir/crMetMatrix.npy
+    (or working_dir/crRoulette.db with the "sqlite" backend)
     working_dir/crConversationStarters.txt
 
     """
@@ -43,6 +68,11 @@ def create_coffee_roulette(roulette_name, working_dir=None, participants=None):
 
     roulette_dir = wd / f"CoffeeRoulette-{roulette_name}"
 
+    if storage_backend not in BACKENDS:
+        raise ValueError(f"Unknown storage backend '{storage_backend}'!")
+    if met_storage not in ("dense", "sparse"):
+        raise ValueError(f"Unknown met storage '{met_storage}'!")
+
     if os.path.exists(roulette_dir):
         raise ValueError(
             "Coffee roulette already exists! Run another function or choose a different roulette name!"
@@ -53,6 +83,10 @@ def create_coffee_roulette(roulette_name, working_dir=None, participants=None):
 
     # create participant dictionary (names and who they have met)
     crParticipantDict = {}
+    if interactive == None:
+        interactive = sys.stdin is not None and sys.stdin.isatty()
+    if participants == None and not interactive:
+        participants = []
     if participants == None:
         id = 0
         while True:
@@ -69,15 +103,15 @@ def create_coffee_roulette(roulette_name, working_dir=None, participants=None):
     else:
         raise ValueError("Participants must be a flat list or None!")
 
-    pickle.dump(
-        crParticipantDict, open(roulette_dir / "crParticipantDict.p", "wb")
+    # store participants and the matrix of who has met whom
+    met_class = SparseMetMatrix if met_storage == "sparse" else MetMatrix
+    get_backend(storage_backend, roulette_dir, met_storage).save(
+        {
+            "participants": crParticipantDict,
+            "met": met_class.empty(len(crParticipantDict)),
+        }
     )
 
-    # create pair probability matrix
-    crProbMatrix = np.full((id, id), 1 / (id - 1))
-    np.fill_diagonal(crProbMatrix, 0)
-    np.save(roulette_dir / "crProbMatrix.npy", crProbMatrix)
-
     # create a config file
     cfg_file, ruamelFile = utils.create_config_template()
     cfg_file["roulette_name"] = roulette_name
@@ -90,6 +124,8 @@ def create_coffee_roulette(roulette_name, working_dir=None, participants=None):
         "name_prefix"
     ] = "@"  # for places with usernames (slack, discord, etc)
     cfg_file["meeting_purpose"] = "have coffee"
+    cfg_file["storage_backend"] = storage_backend
+    cfg_file["met_storage"] = met_storage
 
     cfg_path = roulette_dir / "config.yaml"
     utils.write_config(cfg_path, cfg_file)
@@ -110,6 +146,6 @@ def create_coffee_roulette(roulette_name, working_dir=None, participants=None):
     with open(roulette_dir / "crConversationStarters.txt", "w") as f:
         f.writelines(line + "\n" for line in lines)
 
-    print(
-        "\nA new project with name 'CoffeeRoulette-{roulette_name}-{date}' is created at {roulette_dir}.\nUse function 'generate_pairs' to run the first round of the coffee roulette.\nIf you wish to customise the conversation starters, edit the crConversationStarters.txt file in your roulette directory.\nYou can add and remove participants at any time by running the functions 'add_participants' and 'remove_participants' respectively."
+    logger.info(
+        f"\nA new project with name 'CoffeeRoulette-{roulette_name}' is created at {roulette_dir}.\nUse function 'get_pairs' to run the first round of the coffee roulette.\nIf you wish to customise the conversation starters, edit the crConversationStarters.txt file in your roulette directory.\nYou can add and remove participants at any time by running the functions 'add_participants' and 'remove_participants' respectively."
     )
@@ -1,27 +1,59 @@
-from pathlib import Path
-import numpy as np
-import pickle
 import os
+import logging
+import numpy as np
 import datetime as dt
-import random
-from coffee_roulette import utils
+from coffee_roulette.meeting_times import meeting_times
+from coffee_roulette.matching import match_round, recycle_pairs, UnmetGraph
+from coffee_roulette.session import open_roulette, locked
+from coffee_roulette.locking import atomic_write
+from coffee_roulette.schedule import pop_scheduled_round
+from coffee_roulette.constraints import PairingConstraints
+from coffee_roulette.history import MeetingHistory
+from coffee_roulette.stats import RunStats
+
+logger = logging.getLogger(__name__)
 
 
+@locked()
 def get_pairs(
-    cfg_path, conv_starters=True, random_time=True, exclude_nonrandom=None
+    cfg_path,
+    conv_starters=True,
+    random_time=True,
+    exclude_nonrandom=None,
+    engine=None,
+    seed=None,
+    use_schedule=True,
+    spread_times=False,
+    recycle="stalest",
+    on_stats=None,
 ):
     """
-    Generates pairs of participants based on the probability matrix
-    such that people can only be paired with those they have not been
-    paired with before.
+    Generates pairs of participants based on the matrix of who has met
+    whom such that people can only be paired with those they have not been
+    paired with before, and only as config["pairing_constraints"]
+    allow (see coffee_roulette.constraints).
+
+    The round is drawn in a single pass by a matching engine. If not
+    everyone can be given a new partner, the number of pairs that have
+    to repeat a previous meeting is reported and those pairs are drawn
+    among the remaining participants, preferring the pairs that met
+    longest ago according to the meeting history.
+
+    If rounds were precomputed with precompute_schedule(), the next
+    stored round is used and only participants it does not cover are
+    matched on the spot. If that would repeat meetings that a fresh
+    matching of the whole round avoids, the stored round is dropped.
 
-    Prints the freshly generated pairs and, in case of an
-    odd number of participants, the name of the left-out person.
+    Logs the freshly generated pairs and, in case of an
+    odd number of participants, the name of the left-out person
+    (INFO level of the "coffee_roulette" logger) and stores them in
+    the results folder and in the meeting history (see
+    coffee_roulette.history).
 
     PARAMETERS
     -------------
-        cfg_path : string
-            Full path to the config.yaml file
+        cfg_path : string or Roulette
+            Full path to the config.yaml file or an open Roulette session
         conv_starters : bool, optional
             Whether to include suggested conversation starters in the output file
             Default is True
@@ -34,159 +66,198 @@ def get_pairs(
             Participant id or name to exclude
             Find out participant ids and names by running print_participants()
             Defaults to None, which excludes someone randomly
+        engine : string or callable, optional
+            Matching engine, see coffee_roulette.matching
+            Defaults to "maximum" (maximum-cardinality matching), or
+            "sampling" if the config sets met_storage: sparse
+        seed : int or numpy.random.Generator, optional
+            Seed for the random draws
+            Defaults to None (fresh entropy)
+        use_schedule : bool, optional
+            Whether to use the next precomputed round, if there is one
+            Defaults to True
+        spread_times : bool, optional
+            Whether to spread meeting times evenly over the available
+            slots instead of drawing them independently
+            Defaults to False
+        recycle : string, optional
+            How pairs that have to repeat a meeting are chosen:
+            "stalest" (those who met longest ago) or "random"
+            Defaults to "stalest"
+        on_stats : callable, optional
+            Called with the RunStats of the run
+
+    RETURNS
+    -------------
+        stats : RunStats
+            Per-phase timings ("load", "match", "times", "starters",
+            "format", "save") and counters (pairs, repeated_pairs,
+            matrix_size, unmet_density, bytes read and written, ...)
     """
-    cfg = utils.read_config(cfg_path)
-    roulette_dir = Path(cfg["roulette_directory"]).resolve()
-
-    everyone_matched = False
-    iteration = 1
-    output_list = []
-    while not everyone_matched:
-        print(f"Running the iteration #{iteration}...")
-        # load_files
-        crProbMatrix = np.load(roulette_dir / "crProbMatrix.npy")
-        crParticipantDict = pickle.load(
-            open(roulette_dir / "crParticipantDict.p", "rb")
+    if recycle not in ("stalest", "random"):
+        raise ValueError(
+            f"Unknown recycle mode '{recycle}'! Choose 'stalest' or 'random'"
+        )
+    stats = RunStats("get_pairs")
+    roulette = open_roulette(cfg_path)
+    rng = np.random.default_rng(seed)
+
+    with stats.phase("load"), stats.track_io(roulette):
+        cfg = roulette.config
+        roulette_dir = roulette.roulette_dir
+        crMetMatrix = roulette.met
+        crParticipantDict = roulette.participants
+        used_ids = list(roulette.removed.keys())
+
+    with stats.phase("match"):
+        active_ids = np.setdiff1d(np.arange(crMetMatrix.n), used_ids)
+        n_active = int(active_ids.shape[0])
+
+        # if odd number of participants, have the participant id'ed by exclude_nonrandom sit the round out
+        excluded_id = None
+        if active_ids.shape[0] % 2 == 1 and exclude_nonrandom != None:
+            excluded_id = roulette.name_index.find(
+                exclude_nonrandom, roulette.removed
+            )
+            active_ids = active_ids[active_ids != excluded_id]
+
+        constraints = PairingConstraints.from_roulette(roulette)
+
+        # take the next precomputed round, if there is one
+        round_ids, requested_exclusion = active_ids, excluded_id
+        pairs = []
+        if use_schedule:
+            with stats.track_io(roulette):
+                pairs, scheduled_sitout = pop_scheduled_round(
+                    roulette, active_ids, constraints
+                )
+            active_ids = np.setdiff1d(active_ids, np.asarray(pairs, dtype=int))
+            if (
+                active_ids.shape[0] % 2 == 1
+                and scheduled_sitout != None
+                and scheduled_sitout in active_ids
+            ):
+                excluded_id = scheduled_sitout
+                active_ids = active_ids[active_ids != excluded_id]
+        stats.counters["scheduled_pairs"] = len(pairs)
+
+        # draw the round among participants who have not met yet
+        if engine is None:
+            sparse = cfg.get("met_storage") == "sparse"
+            engine = "sampling" if sparse else "maximum"
+        allowed = UnmetGraph(crMetMatrix, active_ids, constraints)
+        new_pairs, repeats, sitout = match_round(
+            allowed, engine=engine, rng=rng
         )
+        if repeats and pairs:
+            # the scheduled pairs leave people who have all met each
+            # other: re-match the whole round if that repeats less
+            full = UnmetGraph(crMetMatrix, round_ids, constraints)
+            rematched = match_round(full, engine=engine, rng=rng)
+            if len(rematched[1]) < len(repeats):
+                new_pairs, repeats, sitout = rematched
+                allowed, active_ids = full, round_ids
+                excluded_id = requested_exclusion
+                pairs = []
+                stats.counters["scheduled_pairs"] = 0
+        if repeats and recycle == "stalest":
+            # repeat the meetings that lie furthest back
+            left = np.asarray(repeats).reshape(-1)
+            with MeetingHistory(roulette_dir) as history:
+                ages = history.pair_ages(active_ids[left])
+            if constraints != None:
+                # pairs the constraints rule out only as a last resort
+                allowed_left = constraints.allowed_submatrix(active_ids[left])
+                ages = np.where(allowed_left, ages, 0)
+            repeats = [(left[i], left[j]) for i, j in recycle_pairs(ages, rng)]
+        pairs += [(active_ids[i], active_ids[j]) for i, j in new_pairs]
+        repeats = [(active_ids[i], active_ids[j]) for i, j in repeats]
+        if repeats:
+            logger.warning(
+                f"No unique pairing exists for everyone! {len(repeats)} pair(s) will repeat a previous meeting."
+            )
+        if sitout != None:
+            excluded_id = active_ids[sitout]
 
-        used_ids = np.empty(0)
-        participant_number = crProbMatrix.shape[0]
+    stats.counters.update(
+        matrix_size=crMetMatrix.n,
+        active_participants=n_active,
+        unmet_density=allowed.density(),
+        pairs=len(pairs),
+        repeated_pairs=len(repeats),
+    )
 
-        if os.path.exists(roulette_dir / "crRemovedParticipantDict.p"):
-            crRemovedParticipantDict = pickle.load(
-                open(roulette_dir / "crRemovedParticipantDict.p", "rb")
+    # draw meeting times for the whole round at once
+    if random_time:
+        with stats.phase("times"):
+            start_date = dt.date.today() + dt.timedelta(days=1)
+            meeting_slots = meeting_times(
+                start_date,
+                cfg["roulette_frequency"],
+                cfg["roulette_times"],
+                cfg["time_spacing"],
+            ).sample_labels(
+                len(pairs) + len(repeats), rng=rng, spread=spread_times
             )
-            used_ids = np.append(
-                used_ids, list(crRemovedParticipantDict.keys())
+
+    # pick conversation starters for the whole round at once
+    if conv_starters:
+        with stats.phase("starters"), stats.track_io(roulette):
+            crConversationStarters = roulette.starter_index
+            q_ids = crConversationStarters.assign(
+                [p[0] for p in pairs + repeats],
+                [p[1] for p in pairs + repeats],
+                rng=rng,
             )
-            used_ids = used_ids.flatten()
-            participant_number = participant_number - len(
-                crRemovedParticipantDict
+        if np.any(q_ids < 0):
+            logger.warning(
+                "All conversation starters have been used! Add more!"
             )
 
-        # if odd number of participants, have the participant id'ed by exclude_nonrandom sit the round out
-        if participant_number % 2 == 1 and exclude_nonrandom != None:
-            used_ids = np.append(used_ids, [exclude_nonrandom])
-            participant_number = participant_number - len(exclude_nonrandom)
+    with stats.phase("format"):
+        output_list = []
+        for k, (i, j) in enumerate(pairs + repeats):
+            output_str = f"- @{crParticipantDict[i][0]} will {cfg['meeting_purpose']} with @{crParticipantDict[j][0]}"
+
+            # add the meeting time
+            if random_time:
+                output_str += f". Perhaps on {meeting_slots[k]}?"
+
+            # add the conversation starter
+            if conv_starters and q_ids[k] >= 0:
+                question = crConversationStarters.lines[q_ids[k]]
+                output_str += f" Suggested conversation starter: {question}"
 
-        # set up meeting timeframes
-        if random_time:
-            weeks = cfg["roulette_frequency"]
-            times = cfg["roulette_times"]
-            spacing = cfg["time_spacing"]
+            logger.info(output_str)
+            output_list.append(output_str)
 
-            t = dt.date.today()  # the day the code is run
-            start_date = t + dt.timedelta(days=1)
-            day_number = int(7 * weeks)  # days until the next draw
+        # report the unpaired participant if the total number is odd
+        if excluded_id != None:
+            unpaired_str = f"{crParticipantDict[excluded_id][0]} was not paired with anyone this time!"
+            logger.info(unpaired_str)
+            output_list.append(unpaired_str)
 
-            reasonable_times = utils.get_meeting_times(times, spacing)
+    with stats.phase("save"), stats.track_io(roulette):
+        round_pairs = np.asarray(pairs + repeats, dtype=int).reshape(-1, 2)
+        crMetMatrix.mark_met(round_pairs[:, 0], round_pairs[:, 1])
 
-        for p in range(int(participant_number / 2)):
-            unused_ids = np.setdiff1d(
-                np.arange(crProbMatrix.shape[0]), used_ids
+        now = dt.datetime.today()
+        rdate = now.strftime("%Y-%m-%d")
+        rtime = now.strftime("%H%M%S")
+
+        results_path = (
+            roulette_dir / "results" / f"{rdate}_crPairings_{rtime}.txt"
+        )
+        with atomic_write(results_path, "w") as f:
+            f.writelines(line + "\n" for line in output_list)
+        stats.counters["bytes_written"] = stats.counters.get(
+            "bytes_written", 0
+        ) + os.path.getsize(results_path)
+        with MeetingHistory(roulette_dir) as history:
+            stats.counters["round_id"] = history.record_round(
+                pairs, repeats, excluded_id, when=now, source=results_path.name
             )
-            max_val_remaining_crProbMatrix = crProbMatrix[
-                np.repeat(unused_ids, unused_ids.shape),
-                np.tile(unused_ids, unused_ids.shape),
-            ].max()
-            i, j = np.where(crProbMatrix == max_val_remaining_crProbMatrix)
-            for x in used_ids:
-                ids_to_remove = np.where(i == x)
-                i = np.delete(i, ids_to_remove)
-                j = np.delete(j, ids_to_remove)
-                jds_to_remove = np.where(j == x)
-                i = np.delete(i, jds_to_remove)
-                j = np.delete(j, jds_to_remove)
-            id = np.random.choice(len(i))
-            output_str = f"- @{crParticipantDict[i[id]][0]} will {cfg['meeting_purpose']} with @{crParticipantDict[j[id]][0]}"
-
-            # generate a random meeting time
-            if random_time:
-                meeting_weekday = "Saturday"
-                while (
-                    meeting_weekday == "Saturday"
-                    or meeting_weekday == "Sunday"
-                ):
-                    random_number_of_days = random.randrange(day_number)
-                    meeting_date = start_date + dt.timedelta(
-                        random_number_of_days
-                    )
-                    meeting_weekday = meeting_date.strftime("%A")
-                meeting_time = random.choice(reasonable_times)
-                output_str += f". Perhaps on {meeting_date.strftime('%A')}, {meeting_date.strftime('%B %d')}, at {':'.join(str(meeting_time).split(':')[:2])}?"
-
-            # generate a conversation starter
-            if conv_starters:
-                # find conv starters not used by either participant
-                used_conv_starters = (
-                    crParticipantDict[i[id]][1] + crParticipantDict[j[id]][1]
-                )
-                all_conv_starters = np.arange(
-                    len(
-                        open(
-                            roulette_dir / "crConversationStarters.txt"
-                        ).readlines()
-                    )
-                )
-                available_conv_starters = np.setdiff1d(
-                    all_conv_starters, used_conv_starters
-                )
+        roulette.mark_dirty("met", "participants")
+        roulette.commit()
 
-                # pick a random question
-                if available_conv_starters.shape[0] > 0:
-                    q_id = np.random.choice(available_conv_starters)
-                    with open(
-                        roulette_dir / "crConversationStarters.txt", "r"
-                    ) as text_file:
-                        for l, line in enumerate(text_file):
-                            if l == q_id:
-                                question = line
-                else:
-                    print(
-                        "All conversation starters have been used! Add more!"
-                    )
-                    break
-                # add the question id to participants' conversation starter history
-                crParticipantDict[i[id]][1].append(q_id)
-                crParticipantDict[j[id]][1].append(q_id)
-                output_str += f" Suggested conversation starter: {question} "
-
-            # check that the last pairing has not met already
-            if (
-                crProbMatrix[i[id], j[id]] != 0
-            ):  # all good - these people have not met yet!
-                print(output_str)
-                output_list.append(output_str)
-                used_ids = np.concatenate((used_ids, [i[id], j[id]]))
-                crProbMatrix[i[id], j[id]] = 0
-                crProbMatrix[j[id], i[id]] = 0
-                if p == (int(participant_number / 2)) - 1:
-                    print(f"Success! Number of iterations needed: {iteration}")
-                    everyone_matched = True
-            else:  # problem! break out of the for loop, start over!
-                iteration += 1
-                break
-
-    # print a line about an unpaired participant if the total number is odd and exclusion is random
-    if participant_number % 2 == 1:
-        unpaired_id = np.setdiff1d(np.arange(crProbMatrix.shape[0]), used_ids)
-        unpaired_str = f"{crParticipantDict[unpaired_id[0]][0]} was not paired with anyone this time!"
-        print(unpaired_str)
-        output_list.append(unpaired_str)
-
-    # recompute probabilities and update the matrix
-    for row in range(crProbMatrix.shape[0]):
-        nonzeros = crProbMatrix[row] != 0
-        crProbMatrix[row, nonzeros] = 1 / nonzeros.sum()
-
-    rdate = dt.datetime.today().strftime("%Y-%m-%d")
-    rtime = dt.datetime.today().strftime("%H%M%S")
-
-    with open(
-        roulette_dir / "results" / f"{rdate}_crPairings_{rtime}.txt", "w"
-    ) as f:
-        f.writelines(line + "\n" for line in output_list)
-    np.save(roulette_dir / "crProbMatrix.npy", crProbMatrix)
-    pickle.dump(
-        crParticipantDict, open(roulette_dir / "crParticipantDict.p", "wb")
-    )
+    return stats.finish(on_stats)
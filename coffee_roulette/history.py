@@ -0,0 +1,466 @@
+import re
+import json
+import sqlite3
+import numpy as np
+import logging
+import datetime as dt
+from coffee_roulette.session import open_roulette, locked
+from coffee_roulette.names import normalize_name
+
+logger = logging.getLogger(__name__)
+
+HISTORY_FILE = "crHistory.db"
+AGE_UNKNOWN = np.iinfo(np.uint16).max
+
+PAIR_LINE = re.compile(
+    r"^- @(?P<a>.+?) will .+ with @(?P<b>.+?)"
+    r"(?:\. Perhaps on .*| Suggested conversation starter: .*)?$"
+)
+SITOUT_LINE = re.compile(
+    r"^(?P<name>.+) was not paired with anyone this time!$"
+)
+RESULTS_NAME = re.compile(
+    r"^(?P<date>\d{4}-\d{2}-\d{2})_crPairings_(?P<time>\d{6})\.txt$"
+)
+
+
+class MeetingHistory:
+    """
+    Append-only record of every round, kept in crHistory.db next to the
+    results files.
+
+    Each round gets an increasing round id and stores its pairs and the
+    participant who sat out. Rounds are only ever added, never
+    rewritten. The pairs are indexed by (participant, round) and by
+    pair, so "when did A last meet B", "whom did A meet" and "who sat
+    out most" are answered from the indexes instead of reading every
+    results file.
+
+    Ids are those of the current participant dictionary. When removed
+    participants are compacted away (see coffee_roulette.compact), the
+    history is renumbered with them and the retired participants are
+    kept under negative ids with their names.
+
+    PARAMETERS
+    -------------
+        roulette_dir : Path
+            Roulette directory
+    """
+
+    schema = """
+    CREATE TABLE IF NOT EXISTS rounds (
+        id INTEGER PRIMARY KEY,
+        date TEXT NOT NULL,
+        time TEXT NOT NULL,
+        source TEXT
+    );
+    CREATE INDEX IF NOT EXISTS rounds_source ON rounds (source);
+    CREATE TABLE IF NOT EXISTS meetings (
+        round INTEGER NOT NULL,
+        a INTEGER NOT NULL,
+        b INTEGER NOT NULL,
+        repeat INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (a, b, round)
+    ) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS meetings_round ON meetings (round);
+    CREATE INDEX IF NOT EXISTS meetings_b ON meetings (b, round);
+    CREATE TABLE IF NOT EXISTS sitouts (
+        participant INTEGER NOT NULL,
+        round INTEGER NOT NULL,
+        PRIMARY KEY (participant, round)
+    ) WITHOUT ROWID;
+    CREATE TABLE IF NOT EXISTS retired (
+        id INTEGER PRIMARY KEY,
+        name TEXT NOT NULL
+    );
+    """
+
+    def __init__(self, roulette_dir):
+        self.path = roulette_dir / HISTORY_FILE
+        self.connection = sqlite3.connect(self.path)
+        self.connection.executescript(self.schema)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        self.connection.close()
+
+    def record_round(
+        self, pairs, repeats=(), sitout=None, when=None, source=None
+    ):
+        """
+        Appends a round
+
+        PARAMETERS
+        -------------
+            pairs : list of (int, int)
+                Participant ids of the new pairs
+            repeats : list of (int, int), optional
+                Pairs that repeat an earlier meeting
+            sitout : int, optional
+                Participant id of the person left out
+            when : datetime.datetime, optional
+                Defaults to now
+            source : string, optional
+                Name of the results file of the round
+
+        RETURNS
+        -------------
+            round_id : int
+        """
+        when = when or dt.datetime.today()
+        with self.connection:
+            round_id = self.connection.execute(
+                "INSERT INTO rounds (date, time, source) VALUES (?, ?, ?)",
+                (
+                    when.strftime("%Y-%m-%d"),
+                    when.strftime("%H:%M:%S"),
+                    source,
+                ),
+            ).lastrowid
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO meetings (round, a, b, repeat) VALUES (?, ?, ?, ?)",
+                [
+                    (round_id, min(i, j), max(i, j), repeat)
+                    for repeat, round_pairs in ((0, pairs), (1, repeats))
+                    for i, j in ((int(i), int(j)) for i, j in round_pairs)
+                ],
+            )
+            if sitout != None:
+                self.connection.execute(
+                    "INSERT INTO sitouts (participant, round) VALUES (?, ?)",
+                    (int(sitout), round_id),
+                )
+        return round_id
+
+    def has_source(self, source):
+        return (
+            self.connection.execute(
+                "SELECT 1 FROM rounds WHERE source = ?", (source,)
+            ).fetchone()
+            != None
+        )
+
+    def rounds(self):
+        """
+        All rounds as (round_id, date, time), oldest first
+        """
+        return self.connection.execute(
+            "SELECT id, date, time FROM rounds ORDER BY date, time, id"
+        ).fetchall()
+
+    def round_pairs(self, round_id):
+        """
+        Pairs of a round as (a, b, repeat) and the id of the participant
+        who sat out (or None)
+        """
+        pairs = self.connection.execute(
+            "SELECT a, b, repeat FROM meetings WHERE round = ? ORDER BY a",
+            (round_id,),
+        ).fetchall()
+        sitout = self.connection.execute(
+            "SELECT participant FROM sitouts WHERE round = ?", (round_id,)
+        ).fetchone()
+        return pairs, sitout[0] if sitout else None
+
+    def meetings(self, a, b):
+        """
+        Rounds in which a and b met as (round_id, date), latest first
+        """
+        return self.connection.execute(
+            """
+            SELECT r.id, r.date FROM meetings m JOIN rounds r ON r.id = m.round
+            WHERE m.a = ? AND m.b = ? ORDER BY r.date DESC, r.time DESC
+            """,
+            (min(a, b), max(a, b)),
+        ).fetchall()
+
+    def partners(self, participant):
+        """
+        Everyone participant has met as (round_id, date, partner),
+        latest first
+        """
+        return self.connection.execute(
+            """
+            SELECT r.id, r.date, m.partner FROM (
+                SELECT round, b AS partner FROM meetings WHERE a = ?
+                UNION ALL
+                SELECT round, a AS partner FROM meetings WHERE b = ?
+            ) m JOIN rounds r ON r.id = m.round
+            ORDER BY r.date DESC, r.time DESC
+            """,
+            (participant, participant),
+        ).fetchall()
+
+    def pair_ages(self, ids):
+        """
+        Number of rounds since each pair of ids last met, as a k x k
+        uint16 matrix (1 = met in the latest round). Pairs without a
+        recorded meeting and ages beyond the range of uint16 are set to
+        the maximum, 65535. Only meetings among ids are read.
+        """
+        ids = [int(p_id) for p_id in ids]
+        ages = np.full((len(ids), len(ids)), AGE_UNKNOWN, dtype=np.uint16)
+        if len(ids) < 2:
+            return ages
+        # age of every round in chronological order
+        order = [round_id for round_id, _, _ in self.rounds()]
+        age_of = {round_id: len(order) - k for k, round_id in enumerate(order)}
+        position = {p_id: k for k, p_id in enumerate(ids)}
+        members = json.dumps(ids)
+        for a, b, round_id in self.connection.execute(
+            """
+            SELECT a, b, round FROM meetings
+            WHERE a IN (SELECT value FROM json_each(?))
+            AND b IN (SELECT value FROM json_each(?))
+            """,
+            (members, members),
+        ):
+            i, j = position[a], position[b]
+            age = min(age_of[round_id], AGE_UNKNOWN)
+            if age < ages[i, j]:
+                ages[i, j] = ages[j, i] = age
+        return ages
+
+    def retired(self):
+        """
+        Dictionary of retired participant id -> name
+        """
+        return dict(self.connection.execute("SELECT id, name FROM retired"))
+
+    def renumber(self, id_map, retired_names):
+        """
+        Moves the history to new participant ids
+
+        PARAMETERS
+        -------------
+            id_map : dict
+                Old id -> new id for every participant who stays
+            retired_names : dict
+                Old id -> name of every participant who is retired
+
+        RETURNS
+        -------------
+            id_map : dict
+                id_map extended by the new (negative) ids of the
+                retired participants
+        """
+        first = min(self.retired(), default=0)
+        id_map = dict(id_map)
+        with self.connection:
+            for k, (p_id, name) in enumerate(sorted(retired_names.items())):
+                id_map[p_id] = first - 1 - k
+                self.connection.execute(
+                    "INSERT INTO retired (id, name) VALUES (?, ?)",
+                    (id_map[p_id], name),
+                )
+            meetings = [
+                (r, id_map.get(a, a), id_map.get(b, b), repeat)
+                for r, a, b, repeat in self.connection.execute(
+                    "SELECT round, a, b, repeat FROM meetings"
+                )
+            ]
+            sitouts = [
+                (id_map.get(p_id, p_id), r)
+                for p_id, r in self.connection.execute(
+                    "SELECT participant, round FROM sitouts"
+                )
+            ]
+            self.connection.execute("DELETE FROM meetings")
+            self.connection.execute("DELETE FROM sitouts")
+            self.connection.executemany(
+                "INSERT INTO meetings (round, a, b, repeat) VALUES (?, ?, ?, ?)",
+                [(r, min(a, b), max(a, b), rep) for r, a, b, rep in meetings],
+            )
+            self.connection.executemany(
+                "INSERT INTO sitouts (participant, round) VALUES (?, ?)",
+                sitouts,
+            )
+        return id_map
+
+    def sitout_counts(self):
+        """
+        (participant, number of rounds sat out), most first
+        """
+        return self.connection.execute(
+            """
+            SELECT participant, COUNT(*) AS n FROM sitouts
+            GROUP BY participant ORDER BY n DESC, participant
+            """
+        ).fetchall()
+
+
+@locked(shared=True)
+def last_meeting(cfg_path, a, b):
+    """
+    When two participants last met
+
+    PARAMETERS
+    -------------
+        cfg_path : string or Roulette
+            Full path to the config.yaml file or an open Roulette session
+        a, b : int or string
+            Participant ids or names
+
+    RETURNS
+    -------------
+        meeting : (round_id, date) or None if they have never met
+    """
+    roulette = open_roulette(cfg_path)
+    with MeetingHistory(roulette.roulette_dir) as history:
+        a, b = (_participant_id(roulette, history, p) for p in (a, b))
+        meetings = history.meetings(a, b)
+    return meetings[0] if meetings else None
+
+
+@locked(shared=True)
+def meeting_log(cfg_path, participant):
+    """
+    Everyone a participant has met, latest first
+
+    RETURNS
+    -------------
+        meetings : list of (round_id, date, partner name)
+    """
+    roulette = open_roulette(cfg_path)
+    with MeetingHistory(roulette.roulette_dir) as history:
+        p_id = _participant_id(roulette, history, participant)
+        meetings = history.partners(p_id)
+        names = _names(roulette, history)
+    return [(r, d, names[q_id]) for r, d, q_id in meetings]
+
+
+@locked(shared=True)
+def round_pairings(cfg_path, round_id=None):
+    """
+    Pairs of a round by name
+
+    PARAMETERS
+    -------------
+        round_id : int, optional
+            Defaults to the latest round
+
+    RETURNS
+    -------------
+        pairs : list of (name, name)
+        sitout : name or None
+    """
+    roulette = open_roulette(cfg_path)
+    with MeetingHistory(roulette.roulette_dir) as history:
+        if round_id == None:
+            rounds = history.rounds()
+            if not rounds:
+                return [], None
+            round_id = rounds[-1][0]
+        pairs, sitout = history.round_pairs(round_id)
+        names = _names(roulette, history)
+    pairs = [(names[a], names[b]) for a, b, _ in pairs]
+    return pairs, names[sitout] if sitout != None else None
+
+
+@locked(shared=True)
+def sitout_counts(cfg_path):
+    """
+    How often each participant sat a round out, most first
+
+    RETURNS
+    -------------
+        counts : list of (name, count)
+    """
+    roulette = open_roulette(cfg_path)
+    with MeetingHistory(roulette.roulette_dir) as history:
+        counts = history.sitout_counts()
+        names = _names(roulette, history)
+    return [(names[p_id], n) for p_id, n in counts]
+
+
+@locked()
+def import_results(cfg_path):
+    """
+    Records the rounds of existing results/*_crPairings_*.txt files in
+    the meeting history.
+
+    Meant to be run once on a roulette that predates the history; files
+    that are already recorded are skipped, so running it again is
+    harmless. Participants are matched by name. A pair that already
+    met in an earlier imported round is recorded as a repeat.
+
+    PARAMETERS
+    -------------
+        cfg_path : string or Roulette
+            Full path to the config.yaml file or an open Roulette session
+
+    RETURNS
+    -------------
+        imported : int
+            Number of rounds recorded
+    """
+    roulette = open_roulette(cfg_path)
+    ids = {}
+    for p_id, (name, _) in roulette.participants.items():
+        ids.setdefault(name, p_id)
+
+    files = []
+    for path in (roulette.roulette_dir / "results").glob("*_crPairings_*"):
+        match = RESULTS_NAME.match(path.name)
+        if match:
+            when = dt.datetime.strptime(
+                match["date"] + match["time"], "%Y-%m-%d%H%M%S"
+            )
+            files.append((when, path))
+
+    imported = 0
+    with MeetingHistory(roulette.roulette_dir) as history:
+        seen = {
+            (a, b)
+            for r, _, _ in history.rounds()
+            for a, b, _ in history.round_pairs(r)[0]
+        }
+        for when, path in sorted(files):
+            if history.has_source(path.name):
+                continue
+            pairs, repeats, sitout = [], [], None
+            with open(path) as f:
+                for line in f:
+                    line = line.rstrip("\n")
+                    pair = PAIR_LINE.match(line)
+                    left_out = SITOUT_LINE.match(line)
+                    if pair:
+                        a, b = ids.get(pair["a"]), ids.get(pair["b"])
+                        if a == None or b == None:
+                            logger.warning(
+                                f"{path.name}: unknown participant in '{line}'"
+                            )
+                            continue
+                        key = (min(a, b), max(a, b))
+                        (repeats if key in seen else pairs).append(key)
+                        seen.add(key)
+                    elif left_out and left_out["name"] in ids:
+                        sitout = ids[left_out["name"]]
+            history.record_round(
+                pairs, repeats, sitout, when=when, source=path.name
+            )
+            imported += 1
+    logger.info(f"Imported {imported} round(s) into {HISTORY_FILE}.")
+    return imported
+
+
+def _participant_id(roulette, history, participant):
+    try:
+        return roulette.name_index.find(participant, roulette.removed)
+    except ValueError:
+        key = normalize_name(participant, roulette.name_index.prefix)
+        for p_id, name in history.retired().items():
+            if participant == p_id or key == normalize_name(name):
+                return p_id
+        raise
+
+
+def _names(roulette, history):
+    names = {p_id: name for p_id, (name, _) in roulette.participants.items()}
+    names.update(history.retired())
+    return names
@@ -0,0 +1,125 @@
+import os
+import numpy as np
+from coffee_roulette.locking import atomic_write
+
+LABELS_FILE = "crLabels.npz"
+
+
+class Labels:
+    """
+    Participant attributes (team, site, role, ...) stored as label
+    vectors.
+
+    Every attribute is an int32 vector indexed by participant id that
+    holds the position of the participant's value in the attribute's
+    list of categories, or -1 if it is not set. Ids beyond the end of a
+    vector (e.g. participants added later) have no value, so the
+    vectors stay valid as the roulette grows. Stored in crLabels.npz.
+
+    PARAMETERS
+    -------------
+        codes : dict, optional
+            Attribute -> 1D int array of category positions
+        categories : dict, optional
+            Attribute -> list of category values (strings)
+    """
+
+    def __init__(self, codes=None, categories=None):
+        self.codes = {
+            a: np.asarray(c, dtype=np.int32) for a, c in (codes or {}).items()
+        }
+        self.categories = {a: list(c) for a, c in (categories or {}).items()}
+
+    def __repr__(self):
+        return f"Labels({sorted(self.codes)})"
+
+    @property
+    def attributes(self):
+        return sorted(self.codes)
+
+    @classmethod
+    def load(cls, path):
+        if not os.path.exists(path):
+            return cls()
+        codes, categories = {}, {}
+        with np.load(path) as f:
+            for key in f.files:
+                kind, _, attribute = key.partition(":")
+                if kind == "codes":
+                    codes[attribute] = f[key]
+                else:
+                    categories[attribute] = f[key].tolist()
+        return cls(codes, categories)
+
+    def save(self, path):
+        arrays = {}
+        for attribute in self.codes:
+            arrays[f"codes:{attribute}"] = self.codes[attribute]
+            arrays[f"categories:{attribute}"] = np.asarray(
+                self.categories[attribute], dtype=str
+            )
+        with atomic_write(path) as f:
+            np.savez(f, **arrays)
+
+    def set(self, attribute, p_ids, values):
+        """
+        Sets the attribute of participants p_ids to values (None
+        clears it)
+        """
+        p_ids = np.asarray(p_ids, dtype=np.intp).reshape(-1)
+        categories = self.categories.setdefault(attribute, [])
+        positions = {value: k for k, value in enumerate(categories)}
+        new_codes = np.full(p_ids.shape[0], -1, dtype=np.int32)
+        for k, value in enumerate(values):
+            if value is None:
+                continue
+            value = str(value)
+            if value not in positions:
+                positions[value] = len(categories)
+                categories.append(value)
+            new_codes[k] = positions[value]
+
+        codes = self.codes.get(attribute, np.zeros(0, dtype=np.int32))
+        size = int(p_ids.max(initial=-1)) + 1
+        if size > codes.shape[0]:
+            grown = np.full(size, -1, dtype=np.int32)
+            grown[: codes.shape[0]] = codes
+            codes = grown
+        codes[p_ids] = new_codes
+        self.codes[attribute] = codes
+
+    def codes_of(self, attribute, p_ids):
+        """
+        Category positions of participants p_ids (-1 where not set)
+        """
+        p_ids = np.asarray(p_ids, dtype=np.intp)
+        codes = self.codes.get(attribute, np.zeros(0, dtype=np.int32))
+        result = np.full(p_ids.shape, -1, dtype=np.int32)
+        inside = p_ids < codes.shape[0]
+        result[inside] = codes[p_ids[inside]]
+        return result
+
+    def values_of(self, attribute, p_ids):
+        """
+        Attribute values of participants p_ids (None where not set)
+        """
+        categories = self.categories.get(attribute, [])
+        return [
+            categories[c] if c >= 0 else None
+            for c in self.codes_of(attribute, p_ids).tolist()
+        ]
+
+    def remap(self, new_ids, n):
+        """
+        Labels renumbered by new_ids (old id -> new id, -1 to drop)
+        for a roulette of n participants, see compact_roulette()
+        """
+        new_ids = np.asarray(new_ids)
+        codes = {}
+        for attribute in self.codes:
+            old = self.codes_of(attribute, np.arange(new_ids.shape[0]))
+            remapped = np.full(n, -1, dtype=np.int32)
+            kept = new_ids >= 0
+            remapped[new_ids[kept]] = old[kept]
+            codes[attribute] = remapped
+        return Labels(codes, self.categories)
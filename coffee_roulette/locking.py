@@ -0,0 +1,171 @@
+import os
+import sys
+import stat
+import time
+import tempfile
+import contextlib
+from pathlib import Path
+
+if sys.platform == "win32":
+    import msvcrt
+
+    HAVE_FCNTL = False
+else:
+    import fcntl
+
+    HAVE_FCNTL = True
+
+LOCK_FILE = ".crLock"
+VERSION_FILE = "crVersion"
+
+
+class ConflictError(RuntimeError):
+    """
+    Raised by Roulette.commit() when another process has saved the
+    roulette since this session loaded it. Call reload() and redo the
+    operation.
+    """
+
+
+class ProjectLock:
+    """
+    Advisory lock on a roulette directory (flock on .crLock, or
+    msvcrt.locking on Windows).
+
+    Operations that change a roulette hold it exclusively from loading
+    to saving, so that concurrent runs on the same project (e.g. a
+    membership sync during a pairing run) take turns instead of
+    overwriting each other; reads hold it shared. Windows has no shared
+    locks, so there reads take turns as well. The lock is reentrant:
+    nested acquisitions by the same holder only count.
+
+    PARAMETERS
+    -------------
+        roulette_dir : Path
+        timeout : float, optional
+            Seconds to wait for the lock before raising TimeoutError
+            Defaults to None (wait indefinitely)
+    """
+
+    def __init__(self, roulette_dir, timeout=None):
+        self.path = Path(roulette_dir) / LOCK_FILE
+        self.timeout = timeout
+        self._file = None
+        self._modes = []
+
+    @property
+    def held(self):
+        return bool(self._modes)
+
+    @contextlib.contextmanager
+    def __call__(self, shared=False):
+        mode = "shared" if shared else "exclusive"
+        if self._modes and (shared or self._modes[-1] == "exclusive"):
+            # already held strongly enough
+            mode = self._modes[-1]
+        else:
+            self._acquire(shared)
+        self._modes.append(mode)
+        try:
+            yield self
+        finally:
+            self._modes.pop()
+            if not self._modes:
+                self._release()
+            elif self._modes[-1] != mode:
+                # back from exclusive to the enclosing shared lock
+                self._acquire(shared=True)
+
+    def _acquire(self, shared):
+        if self._file is None:
+            self._file = open(self.path, "a+")
+        elif not HAVE_FCNTL:
+            # the (always exclusive) msvcrt lock is already held
+            return
+        if self.timeout is None:
+            _lock(self._file, shared, blocking=True)
+            return
+        deadline = time.monotonic() + self.timeout
+        while not _lock(self._file, shared, blocking=False):
+            if time.monotonic() > deadline:
+                raise TimeoutError(
+                    f"Could not lock {self.path} within {self.timeout} s"
+                )
+            time.sleep(0.01)
+
+    def _release(self):
+        if self._file is not None:
+            _unlock(self._file)
+            self._file.close()
+            self._file = None
+
+
+def _lock(f, shared, blocking):
+    # False if the lock is taken by someone else and blocking is False
+    if sys.platform == "win32":
+        while True:
+            f.seek(0)
+            try:
+                msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+                return True
+            except OSError:
+                if not blocking:
+                    return False
+                time.sleep(0.01)
+    operation = fcntl.LOCK_SH if shared else fcntl.LOCK_EX
+    try:
+        fcntl.flock(f, operation if blocking else operation | fcntl.LOCK_NB)
+    except BlockingIOError:
+        return False
+    return True
+
+
+def _unlock(f):
+    if sys.platform == "win32":
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+    else:
+        fcntl.flock(f, fcntl.LOCK_UN)
+
+
+@contextlib.contextmanager
+def atomic_write(path, mode="wb"):
+    """
+    Opens a temporary file next to path for writing and moves it over
+    path once the block completes, so readers see either the old or the
+    new file and never a partial one. On error path is left untouched.
+    """
+    path = Path(path)
+    fd, tmp_path = tempfile.mkstemp(
+        dir=path.parent, prefix=f".{path.name}.", suffix=".tmp"
+    )
+    try:
+        with os.fdopen(fd, mode) as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        try:
+            os.chmod(tmp_path, stat.S_IMODE(os.stat(path).st_mode))
+        except FileNotFoundError:
+            os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(tmp_path)
+        raise
+
+
+def read_version(roulette_dir):
+    """
+    Number of times the roulette has been saved through a session
+    """
+    try:
+        with open(Path(roulette_dir) / VERSION_FILE) as f:
+            return int(f.read().strip() or 0)
+    except FileNotFoundError:
+        return 0
+
+
+def write_version(roulette_dir, version):
+    with atomic_write(Path(roulette_dir) / VERSION_FILE, "w") as f:
+        f.write(f"{version}\n")
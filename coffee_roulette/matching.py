@@ -0,0 +1,505 @@
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+
+def greedy_matching(allowed, rng):
+    """
+    Draws a maximal matching in a single pass, most constrained
+    participants first.
+
+    Every participant's number of free allowed partners is kept up to
+    date as pairs are drawn. The free participant with the fewest is
+    paired next, with the candidate that itself has the fewest; ties
+    are broken at random. Late in a season, when some people have few
+    partners left, this finds far larger matchings than a random order
+    and leaves less work to maximum_matching(). The cost is O(N) per
+    pair, O(N^2) per round. The result is not guaranteed to be maximum.
+
+    PARAMETERS
+    -------------
+        allowed : 2D boolean array
+            Symmetric matrix where allowed[i, j] means that i and j
+            may be paired (i.e. have not met yet)
+        rng : numpy.random.Generator
+
+    RETURNS
+    -------------
+        match : 1D int array
+            match[i] is the partner of i or -1 if i is unmatched
+    """
+    n = allowed.shape[0]
+    match = np.full(n, -1)
+    free = np.ones(n, dtype=bool)
+    degree = allowed.sum(axis=1) - np.diagonal(allowed)
+    # random tie-breaking between equally constrained participants
+    priority = degree + rng.random(n)
+    while n > 0:
+        u = np.argmin(np.where(free & (degree > 0), priority, np.inf))
+        if not (free[u] and degree[u] > 0):
+            break
+        candidates = np.flatnonzero(allowed[u] & free)
+        candidates = candidates[candidates != u]
+        v = candidates[np.argmin(priority[candidates])]
+        match[u], match[v] = v, u
+        free[u] = free[v] = False
+
+        # the free partners of u and v lose a candidate
+        lost = (allowed[u] & free).astype(int) + (allowed[v] & free)
+        degree -= lost
+        priority -= lost
+    return match
+
+
+def maximum_matching(allowed, rng):
+    """
+    Finds a maximum-cardinality matching.
+
+    A random greedy matching is grown with augmenting paths
+    (Edmonds' blossom algorithm). Every participant left unmatched by the
+    greedy pass is searched from once, so the cost is bounded by
+    O(unmatched * edges) and the result contains as many pairs as any
+    valid round can possibly have.
+
+    PARAMETERS
+    -------------
+        allowed : 2D boolean array
+            Symmetric matrix where allowed[i, j] means that i and j
+            may be paired (i.e. have not met yet)
+        rng : numpy.random.Generator
+
+    RETURNS
+    -------------
+        match : 1D int array
+            match[i] is the partner of i or -1 if i is unmatched
+    """
+    return _augment_matching(allowed, greedy_matching(allowed, rng), rng)
+
+
+def _augment_matching(allowed, match, rng):
+    """
+    Grows match into a maximum matching with augmenting paths from
+    every unmatched participant
+    """
+    n = allowed.shape[0]
+    if np.count_nonzero(match < 0) < 2:
+        # nothing left to augment
+        return match
+    match = match.tolist()
+    graph = []
+    for u in range(n):
+        neighbours = np.flatnonzero(allowed[u])
+        graph.append(rng.permutation(neighbours[neighbours != u]).tolist())
+
+    for root in rng.permutation(n).tolist():
+        if match[root] == -1:
+            _augment_from(root, graph, match)
+    return np.asarray(match, dtype=int)
+
+
+def _augment_from(root, graph, match):
+    """
+    Searches for an augmenting path starting at an unmatched vertex
+    and flips it if found
+    """
+    n = len(graph)
+    used = [False] * n
+    parent = [-1] * n
+    base = list(range(n))
+
+    def lowest_common_ancestor(a, b):
+        visited = [False] * n
+        while True:
+            a = base[a]
+            visited[a] = True
+            if match[a] == -1:
+                break
+            a = parent[match[a]]
+        while True:
+            b = base[b]
+            if visited[b]:
+                return b
+            b = parent[match[b]]
+
+    def mark_path(v, b, child, blossom):
+        while base[v] != b:
+            blossom[base[v]] = blossom[base[match[v]]] = True
+            parent[v] = child
+            child = match[v]
+            v = parent[match[v]]
+
+    used[root] = True
+    queue = deque([root])
+    while queue:
+        v = queue.popleft()
+        for to in graph[v]:
+            if base[v] == base[to] or match[v] == to:
+                continue
+            if to == root or (match[to] != -1 and parent[match[to]] != -1):
+                # odd cycle found: contract the blossom
+                current_base = lowest_common_ancestor(v, to)
+                blossom = [False] * n
+                mark_path(v, current_base, to, blossom)
+                mark_path(to, current_base, v, blossom)
+                for i in range(n):
+                    if blossom[base[i]]:
+                        base[i] = current_base
+                        if not used[i]:
+                            used[i] = True
+                            queue.append(i)
+            elif parent[to] == -1:
+                parent[to] = v
+                if match[to] == -1:
+                    # augmenting path found: flip it
+                    while to != -1:
+                        pv = parent[to]
+                        ppv = match[pv]
+                        match[to] = pv
+                        match[pv] = to
+                        to = ppv
+                    return True
+                used[match[to]] = True
+                queue.append(match[to])
+    return False
+
+
+def sampling_matching(graph, rng, rounds=32, dense_below=512):
+    """
+    Draws a matching by rejection sampling, without building the N x N
+    matrix of allowed pairs.
+
+    The free participants are shuffled and paired off in order; pairs
+    that are allowed are kept and the rest are reshuffled and tried
+    again. Once few participants remain free (dense_below) or a
+    reshuffle no longer finds new pairs, the rest is matched exactly
+    with maximum_matching() on a small dense submatrix, together with
+    some of the pairs already drawn so that partners can be swapped
+    where the leftovers have all met each other. When almost
+    all pairs are allowed, as in a large roulette after a few rounds,
+    the cost scales with N and the number of meetings rather than N*N.
+
+    PARAMETERS
+    -------------
+        graph : UnmetGraph
+            Pairs that may be drawn
+        rng : numpy.random.Generator
+        rounds : int, optional
+            Reshuffles without a new pair before falling back
+        dense_below : int, optional
+            Number of free participants below which to fall back
+
+    RETURNS
+    -------------
+        match : 1D int array
+            match[i] is the partner of i or -1 if i is unmatched
+    """
+    n = len(graph)
+    match = np.full(n, -1)
+    free = rng.permutation(n)
+    misses = 0
+    while free.shape[0] > dense_below and misses < rounds:
+        free = rng.permutation(free)
+        half = free.shape[0] // 2
+        i, j = free[:half], free[half : 2 * half]
+        ok = graph.is_unmet(i, j)
+        if not ok.any():
+            misses += 1
+            continue
+        match[i[ok]], match[j[ok]] = j[ok], i[ok]
+        free = np.concatenate([i[~ok], j[~ok], free[2 * half :]])
+
+    _rematch_rest(graph, match, free, rng, dense_below)
+    return match
+
+
+def sharded_matching(graph, rng, shard_size=4096, workers=None):
+    """
+    Matches a huge pool in shards on several cores.
+
+    The participants are split at random into shards of about
+    shard_size, so shard boundaries change every round and people mix
+    across the whole pool over time. Every shard is matched exactly
+    with maximum_matching() in a worker process, on the slice of the
+    met pairs (and pairing constraints) among its own members. The
+    participants left unmatched in all shards are then matched
+    together, with some of the shard pairs reopened, in a single
+    exact pass. Only pairs the graph allows are ever returned.
+
+    Use functools.partial to change the defaults, e.g.
+    register_engine(
+        "sharded8", partial(sharded_matching, workers=8), sparse=True
+    )
+
+    PARAMETERS
+    -------------
+        graph : UnmetGraph
+            Pairs that may be drawn
+        rng : numpy.random.Generator
+        shard_size : int, optional
+            Participants per shard
+        workers : int, optional
+            Number of worker processes; 1 matches the shards in this
+            process
+            Defaults to the number of CPUs
+
+    RETURNS
+    -------------
+        match : 1D int array
+            match[i] is the partner of i or -1 if i is unmatched
+    """
+    n = len(graph)
+    if n <= shard_size:
+        return maximum_matching(graph.dense(), rng)
+    shards = np.array_split(rng.permutation(n), -(-n // shard_size))
+    seeds = np.random.SeedSequence(rng.integers(2**63)).spawn(len(shards))
+    # shards travel to the workers bit-packed
+    jobs = (
+        (np.packbits(graph.subgraph(shard).dense(), axis=1), seed)
+        for shard, seed in zip(shards, seeds)
+    )
+
+    match = np.full(n, -1)
+    if workers == 1:
+        results = map(_match_shard, jobs)
+    else:
+        executor = ProcessPoolExecutor(max_workers=workers)
+        results = executor.map(_match_shard, jobs)
+    try:
+        for shard, local in zip(shards, results):
+            paired = local >= 0
+            match[shard[paired]] = shard[local[paired]]
+    finally:
+        if workers != 1:
+            executor.shutdown()
+
+    # reconcile the leftovers of all shards into one round
+    _rematch_rest(graph, match, np.flatnonzero(match < 0), rng, 512)
+    return match
+
+
+def _match_shard(job):
+    packed, seed = job
+    allowed = np.unpackbits(packed, axis=1, count=packed.shape[0])
+    return maximum_matching(allowed.astype(bool), np.random.default_rng(seed))
+
+
+def _rematch_rest(graph, match, free, rng, budget):
+    """
+    Matches the free positions exactly together with some random pairs
+    found so far (up to budget participants in all), which lets the
+    exact matching swap partners with them where the free participants
+    have all met each other
+    """
+    if free.shape[0] < 2:
+        return
+    n = match.shape[0]
+    matched = np.flatnonzero(match > np.arange(n))
+    k = min(matched.shape[0], max(0, budget - free.shape[0]) // 2)
+    reopened = rng.choice(matched, size=k, replace=False)
+    reopened = np.concatenate([reopened, match[reopened]])
+    match[reopened] = -1
+    free = np.concatenate([free, reopened])
+    rest = maximum_matching(graph.subgraph(free).dense(), rng)
+    paired = rest >= 0
+    match[free[paired]] = free[rest[paired]]
+
+
+class UnmetGraph:
+    """
+    Pairs of active participants that have not met yet.
+
+    Passed to the matching engines in SPARSE_ENGINES instead of the
+    dense matrix, so that they can test pairs on demand;
+    other engines receive dense(). Indices are positions in ids.
+
+    PARAMETERS
+    -------------
+        met : MetMatrix or SparseMetMatrix
+        ids : 1D int array
+            Participant ids of the active participants
+        constraints : PairingConstraints, optional
+            Rules that further exclude pairs, see
+            coffee_roulette.constraints
+    """
+
+    def __init__(self, met, ids, constraints=None):
+        self.met = met
+        self.ids = np.asarray(ids, dtype=np.intp)
+        self.constraints = constraints
+        self._dense = None
+
+    def __len__(self):
+        return self.ids.shape[0]
+
+    def dense(self):
+        """
+        Boolean matrix of allowed pairs (built once)
+        """
+        if self._dense is None:
+            self._dense = self.met.unmet_submatrix(self.ids)
+            if self.constraints != None:
+                self._dense &= self.constraints.allowed_submatrix(self.ids)
+        return self._dense
+
+    def is_unmet(self, i, j):
+        """
+        Whether the pairs (i[k], j[k]) may be drawn
+        """
+        i = np.asarray(i, dtype=np.intp)
+        j = np.asarray(j, dtype=np.intp)
+        if self._dense is not None:
+            return self._dense[i, j]
+        ok = (i != j) & ~self.met.has_met(self.ids[i], self.ids[j])
+        if self.constraints != None:
+            ok &= self.constraints.allowed(self.ids[i], self.ids[j])
+        return ok
+
+    def subgraph(self, local):
+        """
+        The graph restricted to the positions local
+        """
+        return UnmetGraph(
+            self.met, self.ids[np.asarray(local)], self.constraints
+        )
+
+    def density(self):
+        """
+        Share of allowed pairs; estimated from the met counts (which
+        include removed participants) unless dense() has been built
+        """
+        k = len(self)
+        if k < 2:
+            return 0.0
+        if self._dense is not None:
+            return float(self._dense.mean())
+        met = self.met.met_counts[self.ids].mean() - 1
+        return float(max(0.0, (k - 1 - met) / k))
+
+
+class _DenseGraph(UnmetGraph):
+    # lets sparse engines run on a plain boolean matrix
+    def __init__(self, allowed):
+        self.ids = np.arange(allowed.shape[0])
+        self._dense = allowed
+
+    def subgraph(self, local):
+        local = np.asarray(local)
+        return _DenseGraph(self._dense[np.ix_(local, local)])
+
+
+MATCHING_ENGINES = {
+    "greedy": greedy_matching,
+    "maximum": maximum_matching,
+    "sampling": sampling_matching,
+    "sharded": sharded_matching,
+}
+
+# engines that take an UnmetGraph rather than a dense matrix
+SPARSE_ENGINES = {sampling_matching, sharded_matching}
+
+
+def register_engine(name, engine, sparse=False):
+    """
+    Makes a custom matching engine available to get_pairs()
+
+    PARAMETERS
+    -------------
+        name : string
+            Name used to select the engine
+        engine : callable
+            engine(allowed, rng) returning an array of partner indices
+            (-1 for unmatched), see maximum_matching()
+        sparse : bool, optional
+            Whether to pass the engine an UnmetGraph instead of the
+            dense matrix, see sampling_matching()
+            Defaults to False
+    """
+    MATCHING_ENGINES[name] = engine
+    if sparse:
+        SPARSE_ENGINES.add(engine)
+
+
+def recycle_pairs(ages, rng=None):
+    """
+    Pairs participants who have all met each other, those who met
+    longest ago first.
+
+    Candidate pairs are taken in order of decreasing age (ties in
+    random order) whenever both participants are still free, in one
+    pass over the k * (k - 1) / 2 pairs.
+
+    PARAMETERS
+    -------------
+        ages : 2D int array
+            Symmetric matrix of rounds since i and j last met, see
+            MeetingHistory.pair_ages()
+        rng : numpy.random.Generator, int or None, optional
+
+    RETURNS
+    -------------
+        pairs : list of (int, int)
+            Indices into ages
+    """
+    rng = np.random.default_rng(rng)
+    k = ages.shape[0]
+    i, j = np.triu_indices(k, 1)
+    order = np.lexsort((rng.random(i.shape[0]), -ages[i, j].astype(int)))
+    free = np.ones(k, dtype=bool)
+    pairs = []
+    for a, b in zip(i[order].tolist(), j[order].tolist()):
+        if free[a] and free[b]:
+            free[a] = free[b] = False
+            pairs.append((a, b))
+            if len(pairs) == k // 2:
+                break
+    return pairs
+
+
+def match_round(allowed, engine="maximum", rng=None):
+    """
+    Draws one round of pairs.
+
+    Pairs are drawn among allowed partners with the chosen engine. If no
+    perfect matching of allowed partners exists, the participants left
+    over are paired among themselves and reported as repeats.
+
+    PARAMETERS
+    -------------
+        allowed : 2D boolean array or UnmetGraph
+            Symmetric matrix or graph of pairs that may be drawn
+        engine : string or callable, optional
+            Name of a registered engine or an engine function
+            Defaults to "maximum"
+        rng : numpy.random.Generator, int or None, optional
+
+    RETURNS
+    -------------
+        pairs : list of (int, int)
+            New pairs (indices into allowed)
+        repeats : list of (int, int)
+            Pairs that were not allowed but had to be drawn
+        sitout : int or None
+            Index of the participant left without a partner
+    """
+    rng = np.random.default_rng(rng)
+    if not callable(engine):
+        if engine not in MATCHING_ENGINES:
+            raise ValueError(
+                f"Unknown matching engine '{engine}'! Choose one of {list(MATCHING_ENGINES)}"
+            )
+        engine = MATCHING_ENGINES[engine]
+
+    if engine in SPARSE_ENGINES:
+        if not isinstance(allowed, UnmetGraph):
+            allowed = _DenseGraph(np.asarray(allowed))
+    elif isinstance(allowed, UnmetGraph):
+        allowed = allowed.dense()
+    match = np.asarray(engine(allowed, rng))
+    pairs = [(int(i), int(j)) for i, j in enumerate(match) if i < j]
+
+    unmatched = rng.permutation(np.flatnonzero(match == -1)).tolist()
+    sitout = unmatched.pop() if len(unmatched) % 2 == 1 else None
+    repeats = [
+        (unmatched[k], unmatched[k + 1]) for k in range(0, len(unmatched), 2)
+    ]
+    return pairs, repeats, sitout
@@ -0,0 +1,102 @@
+import functools
+import datetime as dt
+import numpy as np
+from coffee_roulette import utils
+
+
+class MeetingTimes:
+    """
+    Calendar of possible meeting slots until the next roulette round.
+
+    The weekdays in the period and the time slots within a day are
+    computed once, together with their printed labels, so that times
+    for all pairs of a round are drawn with a single NumPy call.
+
+    PARAMETERS
+    -------------
+        start_date : datetime.date
+            First day on which meetings can take place
+        weeks : int or float
+            Length of the period in weeks (config["roulette_frequency"])
+        bounds : list of lists of ints
+            Meeting time bounds (config["roulette_times"])
+        spacing : int
+            Meeting spacing in minutes (config["time_spacing"])
+    """
+
+    def __init__(self, start_date, weeks, bounds, spacing):
+        days = np.arange(
+            np.datetime64(start_date),
+            np.datetime64(start_date + dt.timedelta(days=int(7 * weeks))),
+        )
+        self.dates = days[np.is_busday(days)].astype(object)
+        if len(self.dates) == 0:
+            raise ValueError("No weekdays before the next roulette round!")
+        self.slots = utils.get_meeting_times(bounds, spacing, verbose=False)
+        if len(self.slots) == 0:
+            raise ValueError("No meeting times within the time bounds!")
+
+        self.date_labels = [
+            f"{d.strftime('%A')}, {d.strftime('%B %d')}" for d in self.dates
+        ]
+        self.slot_labels = [
+            ":".join(str(t).split(":")[:2]) for t in self.slots
+        ]
+
+    def sample(self, n, rng=None, spread=False):
+        """
+        Draws n meeting slots
+
+        PARAMETERS
+        -------------
+            n : int
+                Number of meetings
+            rng : numpy.random.Generator, int or None, optional
+            spread : bool, optional
+                If True, meetings are spread evenly over all
+                (day, time) slots so that no slot is booked more than
+                ceil(n / number of slots) times
+                Defaults to False (independent uniform draws)
+
+        RETURNS
+        -------------
+            date_ids, slot_ids : 1D int arrays
+                Indices into self.dates and self.slots
+        """
+        rng = np.random.default_rng(rng)
+        n_dates, n_slots = len(self.dates), len(self.slots)
+        if spread and n == 0:
+            return np.zeros(0, dtype=int), np.zeros(0, dtype=int)
+        if spread:
+            grid = n_dates * n_slots
+            repeats = -(-n // grid)
+            cells = np.concatenate(
+                [rng.permutation(grid) for _ in range(repeats)]
+            )[:n]
+            return cells // n_slots, cells % n_slots
+        return rng.integers(n_dates, size=n), rng.integers(n_slots, size=n)
+
+    def sample_labels(self, n, rng=None, spread=False):
+        """
+        Draws n meeting slots and returns them as printable strings,
+        e.g. "Monday, October 19, at 9:00"
+        """
+        date_ids, slot_ids = self.sample(n, rng=rng, spread=spread)
+        return [
+            f"{self.date_labels[d]}, at {self.slot_labels[s]}"
+            for d, s in zip(date_ids, slot_ids)
+        ]
+
+
+def meeting_times(start_date, weeks, bounds, spacing):
+    """
+    Returns a MeetingTimes calendar, reusing the previous one built
+    from the same arguments
+    """
+    bounds = tuple(tuple(b) for b in bounds)
+    return _cached_meeting_times(start_date, weeks, bounds, spacing)
+
+
+@functools.lru_cache(maxsize=32)
+def _cached_meeting_times(start_date, weeks, bounds, spacing):
+    return MeetingTimes(start_date, weeks, [list(b) for b in bounds], spacing)
@@ -0,0 +1,416 @@
+import os
+import pickle
+import logging
+import numpy as np
+from coffee_roulette.locking import atomic_write
+
+MET_MATRIX_FILE = "crMetMatrix.npy"
+MET_PAIRS_FILE = "crMetPairs.npz"
+LEGACY_PROB_MATRIX_FILE = "crProbMatrix.npy"
+
+logger = logging.getLogger(__name__)
+
+# number of set bits in every possible byte
+_BYTES = np.arange(256, dtype=np.uint8)[:, None]
+_POPCOUNT = np.unpackbits(_BYTES, axis=1).sum(axis=1)
+
+
+class MetMatrix:
+    """
+    Symmetric bit matrix recording which participants have met.
+
+    Row i stores one bit per participant (packed 8 per byte), so N
+    participants take N*N/8 bytes instead of the N*N*8 bytes of the
+    former float64 probability matrix. A participant counts as having
+    met themselves, i.e. the diagonal is always set.
+
+    The number of people each participant has met is kept alongside
+    the bits, so meeting probabilities can be derived on demand
+    without scanning the matrix.
+
+    The in-memory arrays may hold more rows and columns than there are
+    participants (the capacity). Adding participants grows the capacity
+    geometrically, so repeated additions only occasionally copy the
+    matrix.
+    """
+
+    def __init__(self, bits, n=None):
+        self.bits = bits
+        self.n = bits.shape[0] if n is None else n
+        self._met_counts = _row_popcount(self.bits)
+        self._new_pairs = []
+
+    @classmethod
+    def empty(cls, n):
+        """
+        Creates a matrix of n participants who have not met anyone
+        """
+        met = cls(np.zeros((n, _row_bytes(n)), dtype=np.uint8))
+        idx = np.arange(n)
+        met.mark_met(idx, idx)
+        return met
+
+    @classmethod
+    def from_prob_matrix(cls, crProbMatrix):
+        """
+        Converts a legacy probability matrix (0 = have met)
+        """
+        met = np.asarray(crProbMatrix) == 0
+        np.fill_diagonal(met, True)
+        return cls(np.packbits(met, axis=1))
+
+    @classmethod
+    def load(cls, path, mmap_mode=None):
+        """
+        Loads a matrix saved with save()
+
+        PARAMETERS
+        -------------
+            path : string or Path
+            mmap_mode : string, optional
+                Passed to np.load; "r+" edits the file in place
+        """
+        return cls(np.load(path, mmap_mode=mmap_mode))
+
+    def save(self, path):
+        if isinstance(self.bits, np.memmap) and os.path.samefile(
+            self.bits.filename, path
+        ):
+            self.bits.flush()
+        else:
+            with atomic_write(path) as f:
+                np.save(
+                    f,
+                    np.ascontiguousarray(
+                        self.bits[: self.n, : _row_bytes(self.n)]
+                    ),
+                )
+
+    @property
+    def shape(self):
+        return (self.n, self.n)
+
+    @property
+    def capacity(self):
+        return min(self.bits.shape[0], self.bits.shape[1] * 8)
+
+    @property
+    def met_counts(self):
+        """
+        Number of participants each participant has met (incl. themselves)
+        """
+        return self._met_counts[: self.n]
+
+    def has_met(self, i, j):
+        """
+        Whether participants i and j have met (vectorized over i and j)
+        """
+        i = np.asarray(i)
+        j = np.asarray(j)
+        return (self.bits[i, j >> 3] >> (7 - (j & 7))) & 1 == 1
+
+    def mark_met(self, i, j):
+        """
+        Records that participants i and j have met (vectorized)
+        """
+        i = np.atleast_1d(np.asarray(i, dtype=np.intp))
+        j = np.atleast_1d(np.asarray(j, dtype=np.intp))
+        new = ~self.has_met(i, j)
+        i, j = i[new], j[new]
+        # avoid counting a pair listed twice
+        _, unique = np.unique(
+            np.minimum(i, j) * self.n + np.maximum(i, j), return_index=True
+        )
+        i, j = i[unique], j[unique]
+        for a, b in ((i, j), (j, i)):
+            np.bitwise_or.at(
+                self.bits,
+                (a, b >> 3),
+                (np.uint8(0x80) >> (b & 7)).astype(np.uint8),
+            )
+        np.add.at(self._met_counts, i, 1)
+        np.add.at(self._met_counts, j[i != j], 1)
+        if np.any(i != j):
+            self._new_pairs.append((i[i != j], j[i != j]))
+
+    def new_pairs(self):
+        """
+        Pairs marked as met since the last clear_new_pairs(),
+        as two arrays of participant ids
+        """
+        if not self._new_pairs:
+            return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp)
+        i, j = zip(*self._new_pairs)
+        return np.concatenate(i), np.concatenate(j)
+
+    def clear_new_pairs(self):
+        self._new_pairs = []
+
+    def met_rows(self, ids, columns=None):
+        """
+        Unpacks the rows of the given participants into a boolean array
+
+        PARAMETERS
+        -------------
+            ids : array of ints
+                Participant ids of the rows
+            columns : array of ints, optional
+                Participant ids of the columns to keep
+                Defaults to all participants
+        """
+        rows = np.unpackbits(
+            self.bits[np.asarray(ids, dtype=np.intp)], axis=1, count=self.n
+        ).astype(bool)
+        if columns is not None:
+            rows = rows[:, columns]
+        return rows
+
+    def unmet_submatrix(self, ids):
+        """
+        Boolean matrix of which participants among ids have not met
+        """
+        return ~self.met_rows(ids, columns=ids)
+
+    def unmet_counts(self):
+        """
+        Number of participants each participant has not met yet
+        """
+        return self.n - self.met_counts
+
+    def probabilities(self, ids=None):
+        """
+        Derives the meeting probability matrix of the legacy format,
+        i.e. 1/(number of unmet partners) for every unmet pair
+        """
+        if ids is None:
+            ids = np.arange(self.n)
+        unmet = self.unmet_counts()[ids]
+        with np.errstate(divide="ignore"):
+            weights = np.where(unmet > 0, 1 / unmet, 0)
+        return ~self.met_rows(ids) * weights[:, None]
+
+    def pairs(self, chunk=4096):
+        """
+        All pairs that have met, as two arrays of participant ids i < j
+        """
+        i_all, j_all = [], []
+        for start in range(0, self.n, chunk):
+            rows = self.met_rows(np.arange(start, min(start + chunk, self.n)))
+            i, j = np.nonzero(rows)
+            i += start
+            i_all.append(i[i < j])
+            j_all.append(j[i < j])
+        if not i_all:
+            return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp)
+        return np.concatenate(i_all), np.concatenate(j_all)
+
+    def resize(self, n):
+        """
+        Adds participants who have not met anyone up to a total of n.
+
+        The new rows and columns are written in one step and only the
+        counters of the new participants change. If n exceeds the
+        capacity, the arrays are reallocated with at least twice the
+        previous capacity, so adding k participants one call at a time
+        copies the matrix O(log k) times.
+        """
+        old_n = self.n
+        if n > self.capacity:
+            self.reserve(max(n, 2 * self.capacity))
+        # bits beyond the previous size are still zero
+        self.n = n
+        col = np.arange(old_n, n)
+        self.mark_met(col, col)
+
+    def reserve(self, capacity):
+        """
+        Preallocates room for capacity participants
+        """
+        if capacity <= self.capacity:
+            return
+        bits = np.zeros((capacity, _row_bytes(capacity)), dtype=np.uint8)
+        row_bytes = _row_bytes(self.n)
+        bits[: self.n, :row_bytes] = self.bits[: self.n, :row_bytes]
+        met_counts = np.zeros(capacity, dtype=self._met_counts.dtype)
+        met_counts[: self.n] = self.met_counts
+        self.bits, self._met_counts = bits, met_counts
+
+
+class SparseMetMatrix(MetMatrix):
+    """
+    Records which participants have met as a set of partners per
+    participant.
+
+    Memory and the cost of saving scale with the number of meetings
+    rather than N*N, which suits large roulettes that have only run a
+    few rounds. It has the same interface as MetMatrix; met_rows() and
+    unmet_submatrix() build dense rows only for the participants asked
+    for. Stored as an edge list in crMetPairs.npz.
+    """
+
+    def __init__(self, n, i=(), j=()):
+        self.n = n
+        self.partners = [set() for _ in range(n)]
+        self._met_counts = np.ones(n, dtype=np.int64)
+        self._new_pairs = []
+        self.mark_met(i, j)
+        self.clear_new_pairs()
+
+    @classmethod
+    def empty(cls, n):
+        return cls(n)
+
+    @classmethod
+    def from_met_matrix(cls, met):
+        return cls(met.n, *met.pairs())
+
+    @classmethod
+    def load(cls, path, mmap_mode=None):
+        with np.load(path) as f:
+            return cls(int(f["n"]), f["i"], f["j"])
+
+    def save(self, path):
+        i, j = self.pairs()
+        with atomic_write(path) as f:
+            np.savez(f, n=self.n, i=i, j=j)
+
+    @property
+    def capacity(self):
+        return self.n
+
+    def has_met(self, i, j):
+        i = np.asarray(i)
+        j = np.asarray(j)
+        met = np.fromiter(
+            (
+                a == b or b in self.partners[a]
+                for a, b in zip(i.ravel().tolist(), j.ravel().tolist())
+            ),
+            dtype=bool,
+            count=i.size,
+        )
+        return met.reshape(i.shape) if i.ndim else bool(met[0])
+
+    def mark_met(self, i, j):
+        i = np.atleast_1d(np.asarray(i, dtype=np.intp))
+        j = np.atleast_1d(np.asarray(j, dtype=np.intp))
+        new_i, new_j = [], []
+        for a, b in zip(i.tolist(), j.tolist()):
+            if a != b and b not in self.partners[a]:
+                self.partners[a].add(b)
+                self.partners[b].add(a)
+                new_i.append(a)
+                new_j.append(b)
+        if new_i:
+            new_i = np.asarray(new_i, dtype=np.intp)
+            new_j = np.asarray(new_j, dtype=np.intp)
+            np.add.at(self._met_counts, new_i, 1)
+            np.add.at(self._met_counts, new_j, 1)
+            self._new_pairs.append((new_i, new_j))
+
+    def met_rows(self, ids, columns=None):
+        ids = np.asarray(ids, dtype=np.intp)
+        rows = np.zeros((ids.shape[0], self.n), dtype=bool)
+        for row, p_id in enumerate(ids.tolist()):
+            rows[row, list(self.partners[p_id])] = True
+            rows[row, p_id] = True
+        if columns is not None:
+            rows = rows[:, columns]
+        return rows
+
+    def unmet_submatrix(self, ids):
+        ids = np.asarray(ids, dtype=np.intp)
+        position = {p_id: x for x, p_id in enumerate(ids.tolist())}
+        unmet = ~np.eye(ids.shape[0], dtype=bool)
+        for x, p_id in enumerate(ids.tolist()):
+            met = [position[b] for b in self.partners[p_id] if b in position]
+            unmet[x, met] = False
+        return unmet
+
+    def pairs(self, chunk=None):
+        i = [a for a in range(self.n) for b in self.partners[a] if a < b]
+        j = [b for a in range(self.n) for b in self.partners[a] if a < b]
+        return np.asarray(i, dtype=np.intp), np.asarray(j, dtype=np.intp)
+
+    def resize(self, n):
+        self.partners += [set() for _ in range(n - self.n)]
+        met_counts = np.ones(n, dtype=np.int64)
+        met_counts[: self.n] = self.met_counts
+        self._met_counts = met_counts
+        self.n = n
+
+    def reserve(self, capacity):
+        pass
+
+
+def load_met_matrix(roulette_dir, mmap_mode=None, storage="dense"):
+    """
+    Loads the "has met" matrix of a roulette directory.
+
+    Projects created with the legacy float64 crProbMatrix.npy are
+    migrated to the packed crMetMatrix.npy format on first load. The
+    legacy matrix could be smaller than the participant dictionary, so
+    it is grown to cover every participant id, with the missing
+    participants not having met anyone.
+    With storage="sparse", a SparseMetMatrix is loaded from
+    crMetPairs.npz instead, converting crMetMatrix.npy if needed.
+    """
+    path = roulette_dir / MET_MATRIX_FILE
+    legacy_path = roulette_dir / LEGACY_PROB_MATRIX_FILE
+    sparse_path = roulette_dir / MET_PAIRS_FILE
+    if storage == "sparse":
+        if not os.path.exists(sparse_path):
+            logger.info(f"Converting the met matrix to {MET_PAIRS_FILE}...")
+            sparse = SparseMetMatrix.from_met_matrix(
+                load_met_matrix(roulette_dir)
+            )
+            sparse.save(sparse_path)
+            os.remove(path)
+            return sparse
+        return SparseMetMatrix.load(sparse_path)
+    if storage not in (None, "dense"):
+        raise ValueError(f"Unknown met storage '{storage}'!")
+
+    if not os.path.exists(path) and os.path.exists(sparse_path):
+        logger.info(f"Converting {MET_PAIRS_FILE} to {MET_MATRIX_FILE}...")
+        sparse = SparseMetMatrix.load(sparse_path)
+        met = MetMatrix.empty(sparse.n)
+        met.mark_met(*sparse.pairs())
+        met.save(path)
+        os.remove(sparse_path)
+    if not os.path.exists(path):
+        if not os.path.exists(legacy_path):
+            raise FileNotFoundError("Meeting matrix not found!")
+        logger.info(
+            f"Migrating {LEGACY_PROB_MATRIX_FILE} to {MET_MATRIX_FILE}..."
+        )
+        met = MetMatrix.from_prob_matrix(np.load(legacy_path))
+        met.resize(max(met.n, _legacy_participant_count(roulette_dir)))
+        met.save(path)
+        os.remove(legacy_path)
+    return MetMatrix.load(path, mmap_mode=mmap_mode)
+
+
+def _legacy_participant_count(roulette_dir):
+    # ids of the legacy participant dictionary run from 0 to its max
+    from coffee_roulette.backends import PARTICIPANT_FILE
+
+    try:
+        with open(roulette_dir / PARTICIPANT_FILE, "rb") as f:
+            participants = pickle.load(f)
+    except FileNotFoundError:
+        return 0
+    return max(participants, default=-1) + 1
+
+
+def _row_bytes(n):
+    return (n + 7) // 8
+
+
+def _row_popcount(bits, chunk=4096):
+    counts = np.zeros(bits.shape[0], dtype=np.int64)
+    for start in range(0, bits.shape[0], chunk):
+        counts[start : start + chunk] = _POPCOUNT[
+            bits[start : start + chunk]
+        ].sum(axis=1)
+    return counts
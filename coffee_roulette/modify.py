@@ -1,109 +1,156 @@
+import logging
 import numpy as np
-from pathlib import Path
-import os
-import pickle
-from coffee_roulette import utils
+from coffee_roulette.session import open_roulette, locked
+from coffee_roulette.schedule import repair_schedule
+from coffee_roulette.compact import compact_if_needed
+from coffee_roulette.stats import RunStats
 
+logger = logging.getLogger(__name__)
 
-def add_participants(cfg_path: str, participants=[]):
+
+@locked()
+def add_participants(cfg_path, participants=[], labels=None, on_stats=None):
     """
     Adds new participants to the matrix and dictionary.
+
+    All new participants are added in one step: the matrix is grown
+    once and existing rows are left untouched. New participants are
+    also worked into any precomputed schedule.
     ---
     PARAMETERS:
     -------------
-      cfg_path : string
-        Full path to the config.yaml file
+      cfg_path : string or Roulette
+        Full path to the config.yaml file or an open Roulette session
       participants : list of strings
         Names of participants to be added
-    """
-    cfg = utils.read_config(cfg_path)
-    roulette_dir = Path(cfg["roulette_directory"]).resolve()
+      labels : dict, optional
+        Attribute -> list of values, one per new participant (None for
+        no value), see coffee_roulette.constraints
+      on_stats : callable, optional
+        Called with the RunStats of the operation
 
-    # load files
-    crProbMatrix = np.load(roulette_dir / "crProbMatrix.npy")
-    crParticipantDict = pickle.load(
-        open(roulette_dir / "crParticipantDict.p", "rb")
-    )
+    RETURNS:
+    -------------
+      stats : RunStats
+        Timings of the "load", "update" and "save" phases
+    """
+    stats = RunStats("add_participants")
+    roulette = open_roulette(cfg_path)
+    with stats.phase("load"), stats.track_io(roulette):
+        crMetMatrix = roulette.met
+        crParticipantDict = roulette.participants
+
+    # check the labels before anything is changed
+    labels = dict(labels or {})
+    for attribute, values in labels.items():
+        if not isinstance(attribute, str) or not attribute:
+            raise ValueError(f"Invalid label attribute {attribute!r}!")
+        if isinstance(values, str) or len(values) != len(participants):
+            raise ValueError(
+                f"Got {len(values)} '{attribute}' labels for {len(participants)} participants!"
+            )
+
+    with stats.phase("update"), stats.track_io(roulette):
+        # update participant matrix
+        i = crMetMatrix.n
+        crMetMatrix.resize(i + len(participants))
 
-    for name in participants:
-        i = crProbMatrix.shape[0]
+        # update participant dictionary and name index
+        first_id = i
+        name_index = roulette.name_index
+        for name in participants:
+            crParticipantDict[i] = (name, [])
+            name_index.add(i, name)
+            i += 1
 
-        # update participant matrix
-        crProbMatrix = np.hstack((crProbMatrix, np.full((i, 1), 1)))
-        crProbMatrix = np.vstack((crProbMatrix, np.full((1, i + 1), 1)))
-        np.fill_diagonal(crProbMatrix, 0)
+        # label the new participants
+        for attribute, values in labels.items():
+            roulette.labels.set(attribute, np.arange(first_id, i), values)
+            roulette.mark_dirty("labels")
 
-        # update participant dictionary
-        crParticipantDict[i] = (name, [])
+        repair_schedule(roulette)
 
-    for i in range(crProbMatrix.shape[0]):
-        i_not0 = np.nonzero(crProbMatrix[i, :])[0]
-        crProbMatrix[i, :][crProbMatrix[i, :] > 0] = 1 / len(i_not0)
+    with stats.phase("save"), stats.track_io(roulette):
+        roulette.mark_dirty("met", "participants")
+        roulette.commit()
 
-    np.save(roulette_dir / "crProbMatrix.npy", crProbMatrix)
-    pickle.dump(
-        crParticipantDict, open(roulette_dir / "crParticipantDict.p", "wb")
-    )
+    stats.counters.update(added=len(participants), matrix_size=crMetMatrix.n)
+    return stats.finish(on_stats)
 
 
-def remove_participants(cfg_path: str, participants=[]):
+@locked()
+def remove_participants(cfg_path, participants=[], on_stats=None):
     """
     creates (or adds to) a file containing participants that have quit
-    1. find participant ID based on their name (value[0])
+    1. find participant IDs through the name index (case and name_prefix
+       are ignored; ids are accepted too)
     2. add it to a file and save
     3. keep it in other files to avoid messing up other IDs
     4. add the IDs from the "removed" file to user_ids at the start of get_pairs()
+    5. compact the roulette if config["compact_threshold"] is reached
+       (see coffee_roulette.compact)
 
     PARAMETERS:
     -------------
-      cfg_path : string
-        Full path to the config.yaml file
-      participants : [string]
-        Names of participants to be removed
+      cfg_path : string or Roulette
+        Full path to the config.yaml file or an open Roulette session
+      participants : [string or int]
+        Names or ids of participants to be removed
+        Names that match nobody are logged and skipped
+      on_stats : callable, optional
+        Called with the RunStats of the operation
+
+    RETURNS:
+    -------------
+      stats : RunStats
+        Timings of the "load", "update", "save" and "compact" phases;
+        counters "removed" and "unknown" (the entries that matched
+        nobody)
     """
-    cfg = utils.read_config(cfg_path)
-    roulette_dir = Path(cfg["roulette_directory"]).resolve()
-
-    # load participantDict
-    crParticipantDict = pickle.load(
-        open(roulette_dir / "crParticipantDict.p", "rb")
-    )
-    crParticipantArray = (
-        np.asarray(list(crParticipantDict.values()), dtype=object)
-        .flatten()
-        .reshape(-1, 2)
-    )
-    all_participants = crParticipantArray[:, 0]
-
-    # load existing removedDict file
-    removed_participant_path = roulette_dir / "crRemovedParticipantDict.pkl"
-    if os.path.exists(removed_participant_path):
-        crRemovedParticipantDict = pickle.load(
-            open(removed_participant_path, "rb")
+    stats = RunStats("remove_participants")
+    roulette = open_roulette(cfg_path)
+    with stats.phase("load"), stats.track_io(roulette):
+        crParticipantDict = roulette.participants
+        crRemovedParticipantDict = roulette.removed
+
+    with stats.phase("update"), stats.track_io(roulette):
+        p_ids, unknown = roulette.name_index.lookup(
+            participants, crRemovedParticipantDict
         )
-    else:
-        crRemovedParticipantDict = {}
-
-    for p in participants:
-        p_id = np.argwhere(all_participants == p)[0][0]
-        prev_meetings = crParticipantDict[p_id][1]
-        crRemovedParticipantDict[p_id] = (p, prev_meetings)
-
-    pickle.dump(crRemovedParticipantDict, open(removed_participant_path, "wb"))
+        if unknown:
+            logger.warning(
+                f"{len(unknown)} participant(s) not found: {', '.join(map(str, unknown))}"
+            )
+        p_ids = [
+            p_id
+            for p_id in dict.fromkeys(p_ids)
+            if p_id not in crRemovedParticipantDict
+        ]
+
+        for p_id in p_ids:
+            crRemovedParticipantDict[p_id] = crParticipantDict[p_id]
+
+        if p_ids:
+            roulette.removed = crRemovedParticipantDict
+            repair_schedule(roulette)
+
+    with stats.phase("save"), stats.track_io(roulette):
+        roulette.commit()
+
+    with stats.phase("compact"), stats.track_io(roulette):
+        compacted = compact_if_needed(roulette)
+
+    stats.counters.update(
+        removed=len(p_ids), unknown=unknown, compacted=compacted != None
+    )
+    return stats.finish(on_stats)
 
 
-def print_participants(cfg_path: str):
-    cfg = utils.read_config(cfg_path)
-    roulette_dir = Path(cfg["roulette_directory"]).resolve()
-    crParticipantDict = pickle.load(
-        open(roulette_dir / "crParticipantDict.p", "rb")
-    )
-    if os.path.exists(roulette_dir / "crRemovedParticipantDict.pkl"):
-        crRemovedParticipantDict = pickle.load(
-            open(roulette_dir / "crRemovedParticipantDict.pkl", "rb")
-        )
-    else:
-        crRemovedParticipantDict = {}
+@locked(shared=True)
+def print_participants(cfg_path):
+    roulette = open_roulette(cfg_path)
+    crParticipantDict = roulette.participants
+    crRemovedParticipantDict = roulette.removed
 
     from tabulate import tabulate
 
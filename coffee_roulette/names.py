@@ -0,0 +1,90 @@
+import numpy as np
+
+
+def normalize_name(name, prefix="@"):
+    """
+    Key under which a name is looked up: without a leading prefix
+    (config["name_prefix"]), with whitespace collapsed and case folded,
+    so "@Ada  Lovelace" and "ada lovelace" are the same person
+    """
+    name = str(name).strip()
+    if prefix and name.startswith(prefix):
+        name = name[len(prefix) :]
+    return " ".join(name.split()).casefold()
+
+
+class NameIndex:
+    """
+    Hash index from normalized participant names to ids.
+
+    Built once per participant dictionary and updated by
+    add_participants(), so that looking up a batch of k names costs
+    O(k) instead of a scan over all participants per name. Several
+    participants may share a name; lookups then prefer the earliest
+    one who has not been removed.
+
+    PARAMETERS
+    -------------
+        crParticipantDict : dict
+            Participant id -> (name, [conversation starter ids])
+        prefix : string, optional
+            Name prefix that is ignored in lookups
+    """
+
+    def __init__(self, crParticipantDict, prefix="@"):
+        self.crParticipantDict = crParticipantDict
+        self.prefix = prefix
+        self.ids = {}
+        self.size = 0
+        for p_id, (name, _) in crParticipantDict.items():
+            self.add(p_id, name)
+
+    def add(self, p_id, name):
+        self.ids.setdefault(normalize_name(name, self.prefix), []).append(
+            int(p_id)
+        )
+        self.size += 1
+
+    def lookup(self, participants, removed=()):
+        """
+        Resolves names or ids to participant ids
+
+        PARAMETERS
+        -------------
+            participants : list of strings or ints
+                Names (any case, with or without prefix) or ids
+            removed : container of ints, optional
+                Ids of removed participants, only returned for a name
+                if nobody else active has it
+
+        RETURNS
+        -------------
+            ids : list of ints
+                Ids of the participants that were found, in order
+            unknown : list
+                Entries of participants that match nobody
+        """
+        ids, unknown = [], []
+        for participant in participants:
+            if isinstance(participant, (int, np.integer)):
+                if participant in self.crParticipantDict:
+                    ids.append(int(participant))
+                else:
+                    unknown.append(participant)
+                continue
+            matches = self.ids.get(normalize_name(participant, self.prefix))
+            if not matches:
+                unknown.append(participant)
+                continue
+            active = [p_id for p_id in matches if p_id not in removed]
+            ids.append(active[0] if active else matches[0])
+        return ids, unknown
+
+    def find(self, participant, removed=()):
+        """
+        Id of a single participant given their id or name
+        """
+        ids, _ = self.lookup([participant], removed)
+        if not ids:
+            raise ValueError(f"Unknown participant '{participant}'!")
+        return ids[0]
@@ -0,0 +1,218 @@
+import logging
+import numpy as np
+from coffee_roulette.matching import match_round
+from coffee_roulette.session import open_roulette, locked
+from coffee_roulette.constraints import PairingConstraints
+
+logger = logging.getLogger(__name__)
+
+
+@locked()
+def precompute_schedule(cfg_path, rounds, seed=None, engine="maximum"):
+    """
+    Computes the pairs of several future rounds at once and stores
+    them in the roulette directory (crSchedule.json).
+
+    Rounds are taken from a round-robin schedule (circle method) over a
+    random permutation of the active participants, so no pair appears
+    twice within the schedule. Scheduled pairs that have already met or
+    that config["pairing_constraints"] rule out are dropped and the
+    participants concerned are re-matched within their round with the
+    matching engine.
+
+    Each later call to get_pairs() uses the next stored round.
+    add_participants() and remove_participants() repair the remaining
+    rounds rather than discarding them.
+
+    PARAMETERS
+    -------------
+        cfg_path : string or Roulette
+            Full path to the config.yaml file or an open Roulette session
+        rounds : int
+            Number of rounds to compute
+            At most (number of active participants - 1) rounds are unique
+        seed : int or numpy.random.Generator, optional
+            Seed for the random draws
+        engine : string or callable, optional
+            Matching engine used to re-match dropped pairs
+            Defaults to "maximum"
+    """
+    roulette = open_roulette(cfg_path)
+    rng = np.random.default_rng(seed)
+    crMetMatrix = roulette.met
+    active_ids = _active_ids(roulette)
+    constraints = PairingConstraints.from_roulette(roulette)
+
+    players = rng.permutation(active_ids).tolist()
+    if len(players) % 2 == 1:
+        players.append(None)  # whoever meets None sits the round out
+    n = len(players)
+    if n < 2:
+        raise ValueError("At least two active participants are needed!")
+
+    scheduled = set()
+    schedule = []
+    for r in range(rounds):
+        # circle method: players[0] stays put, the others rotate
+        others = players[1:]
+        shift = r % (n - 1)
+        rotated = [players[0]] + others[-shift:] + others[:-shift]
+        sitout = None
+        round_pairs = []
+        for k in range(n // 2):
+            a, b = rotated[k], rotated[n - 1 - k]
+            if a is None or b is None:
+                sitout = b if a is None else a
+            else:
+                round_pairs.append((a, b))
+        schedule.append(
+            _filter_round(
+                crMetMatrix,
+                round_pairs,
+                sitout,
+                active_ids,
+                scheduled,
+                engine,
+                rng,
+                constraints,
+            )
+        )
+
+    roulette.schedule = schedule
+    roulette.commit()
+    logger.info(f"Scheduled {rounds} round(s) of pairs.")
+
+
+def pop_scheduled_round(roulette, active_ids, constraints=None):
+    """
+    Removes the next round from the schedule.
+
+    PARAMETERS
+    -------------
+        roulette : Roulette
+        active_ids : array of ints
+            Participants taking part in this round
+        constraints : PairingConstraints, optional
+            Scheduled pairs they do not allow are dropped
+
+    RETURNS
+    -------------
+        pairs : list of (int, int)
+            Scheduled pairs that are still valid
+        sitout : int or None
+            Scheduled sit-out participant if still active
+    """
+    schedule = roulette.schedule
+    if not schedule:
+        return [], None
+    next_round = schedule.pop(0)
+    roulette.mark_dirty("schedule")
+
+    active = set(int(p) for p in active_ids)
+    pairs = [
+        (a, b)
+        for a, b in next_round["pairs"]
+        if a in active and b in active and not roulette.met.has_met(a, b)
+    ]
+    if constraints != None and pairs:
+        ok = constraints.allowed(*np.asarray(pairs, dtype=np.intp).T)
+        pairs = [pair for pair, keep in zip(pairs, ok) if keep]
+    sitout = next_round["sitout"] if next_round["sitout"] in active else None
+    return pairs, sitout
+
+
+def repair_schedule(roulette, seed=None, engine="maximum"):
+    """
+    Brings the remaining rounds of a schedule in line with the current
+    participants: pairs involving removed participants are dropped and
+    everyone not scheduled in a round (their former partners and new
+    participants) is matched among themselves within that round.
+    """
+    if not roulette.schedule:
+        return
+    rng = np.random.default_rng(seed)
+    active_ids = _active_ids(roulette)
+    active = set(active_ids.tolist())
+    constraints = PairingConstraints.from_roulette(roulette)
+
+    scheduled = set()
+    repaired = []
+    for scheduled_round in roulette.schedule:
+        pairs = [
+            (a, b)
+            for a, b in scheduled_round["pairs"]
+            if a in active and b in active
+        ]
+        sitout = scheduled_round["sitout"]
+        if sitout not in active:
+            sitout = None
+        repaired.append(
+            _filter_round(
+                roulette.met,
+                pairs,
+                sitout,
+                active_ids,
+                scheduled,
+                engine,
+                rng,
+                constraints,
+            )
+        )
+    roulette.schedule = repaired
+
+
+def _filter_round(
+    crMetMatrix,
+    pairs,
+    sitout,
+    active_ids,
+    scheduled,
+    engine,
+    rng,
+    constraints=None,
+):
+    """
+    Drops pairs that have met, are scheduled in an earlier round or are
+    ruled out by the pairing constraints and re-matches everyone left
+    without a partner. Adds the pairs of the round to scheduled.
+    """
+    pairs = [
+        (a, b)
+        for a, b in pairs
+        if (min(a, b), max(a, b)) not in scheduled
+        and not crMetMatrix.has_met(a, b)
+    ]
+    if constraints != None and pairs:
+        ok = constraints.allowed(*np.asarray(pairs, dtype=np.intp).T)
+        pairs = [pair for pair, keep in zip(pairs, ok) if keep]
+    paired = set(p for pair in pairs for p in pair)
+    if sitout != None:
+        paired.add(sitout)
+    free = np.asarray(
+        [p for p in active_ids.tolist() if p not in paired], dtype=int
+    )
+
+    if free.shape[0] > 1:
+        allowed = crMetMatrix.unmet_submatrix(free)
+        if constraints != None:
+            allowed &= constraints.allowed_submatrix(free)
+        position = {p: x for x, p in enumerate(free.tolist())}
+        for a, b in scheduled:
+            if a in position and b in position:
+                allowed[position[a], position[b]] = False
+                allowed[position[b], position[a]] = False
+        new_pairs, _, new_sitout = match_round(allowed, engine=engine, rng=rng)
+        pairs += [(int(free[i]), int(free[j])) for i, j in new_pairs]
+        if sitout == None and new_sitout != None:
+            sitout = int(free[new_sitout])
+    elif free.shape[0] == 1 and sitout == None:
+        sitout = int(free[0])
+
+    scheduled.update((min(a, b), max(a, b)) for a, b in pairs)
+    return {"pairs": [[int(a), int(b)] for a, b in pairs], "sitout": sitout}
+
+
+def _active_ids(roulette):
+    return np.setdiff1d(
+        np.arange(roulette.met.n), list(roulette.removed.keys())
+    )
@@ -0,0 +1,305 @@
+"""
+Local HTTP service that keeps roulettes in memory.
+
+    coffee-roulette serve --root path/to/roulettes --port 8765
+
+Every roulette is opened once as a Roulette session and stays loaded.
+Read requests are answered from a snapshot taken at startup and after
+every change, and never wait for a running operation. Operations that change a
+roulette run in a worker thread, one at a time per roulette, and are
+saved to the project directory as usual.
+
+    GET  /roulettes                         names of the roulettes
+    GET  /roulettes/NAME/participants       active and removed participants
+    GET  /roulettes/NAME/last-round         pairs of the latest round
+    POST /roulettes/NAME/pairs              draw a round; the JSON body holds
+                                            get_pairs() arguments
+    POST /roulettes/NAME/participants       {"add": [...], "remove": [...]}
+    POST /roulettes/NAME/reload             drop the cached state
+
+Requests and responses are JSON. Bind to localhost or a Unix socket
+only: there is no authentication.
+"""
+import json
+import asyncio
+import logging
+from pathlib import Path
+from urllib.parse import urlsplit
+from coffee_roulette.session import Roulette
+
+logger = logging.getLogger(__name__)
+
+GET_PAIRS_ARGUMENTS = {
+    "conv_starters",
+    "random_time",
+    "exclude_nonrandom",
+    "engine",
+    "seed",
+    "use_schedule",
+    "spread_times",
+    "recycle",
+}
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class RouletteService:
+    """
+    Roulettes held in memory and the request handlers that serve them
+
+    PARAMETERS
+    -------------
+        cfg_paths : list of strings, optional
+            Full paths to config.yaml files
+        root : string, optional
+            Directory scanned for CoffeeRoulette-*/config.yaml files
+    """
+
+    def __init__(self, cfg_paths=None, root=None):
+        cfg_paths = [Path(p) for p in (cfg_paths or [])]
+        if root != None:
+            cfg_paths += sorted(
+                Path(root).glob("CoffeeRoulette-*/config.yaml")
+            )
+        self.roulettes = {}
+        for cfg_path in cfg_paths:
+            roulette = Roulette(cfg_path)
+            self.roulettes[str(roulette.config["roulette_name"])] = roulette
+        self.locks = {name: asyncio.Lock() for name in self.roulettes}
+        self.snapshots = {}
+
+    async def start(self):
+        """
+        Loads every roulette and takes its first snapshot, so that
+        reads never have to wait for the roulette; called by
+        start_server()
+        """
+        loop = asyncio.get_running_loop()
+        names = list(self.roulettes)
+        results = await asyncio.gather(
+            *(
+                loop.run_in_executor(
+                    None, _run_and_snapshot, self.roulettes[name], _no_op
+                )
+                for name in names
+            )
+        )
+        for name, (_, snapshot) in zip(names, results):
+            self.snapshots[name] = snapshot
+
+    async def handle(self, method, path, body=None):
+        """
+        Serves one request
+
+        RETURNS
+        -------------
+            status : int
+            response : JSON-serialisable object
+        """
+        parts = [p for p in urlsplit(path).path.split("/") if p]
+        try:
+            if parts == ["roulettes"] and method == "GET":
+                return 200, sorted(self.roulettes)
+            if len(parts) != 3 or parts[0] != "roulettes":
+                raise HTTPError(404, f"No such resource {path}")
+            name, resource = parts[1], parts[2]
+            if name not in self.roulettes:
+                raise HTTPError(404, f"No roulette named '{name}'")
+
+            if method == "GET":
+                snapshot = self.snapshots.get(name)
+                if snapshot is None:
+                    raise HTTPError(503, "The service has not been started")
+                if resource not in ("participants", "last-round"):
+                    raise HTTPError(404, f"No such resource {path}")
+                return 200, snapshot[resource]
+
+            if method == "POST":
+                body = body or {}
+                if resource == "pairs":
+                    unknown = set(body) - GET_PAIRS_ARGUMENTS
+                    if unknown:
+                        raise HTTPError(400, f"Unknown arguments {unknown}")
+                    stats = await self._mutate(
+                        name, lambda r: r.get_pairs(**body).as_dict()
+                    )
+                    return 200, stats
+                if resource == "participants":
+                    return 200, await self._mutate(
+                        name, lambda r: _update_participants(r, body)
+                    )
+                if resource == "reload":
+                    return 200, await self._mutate(name, Roulette.reload)
+            raise HTTPError(405, f"{method} not allowed on {path}")
+        except HTTPError as e:
+            return e.status, {"error": str(e)}
+        except (ValueError, TypeError, FileNotFoundError) as e:
+            return 400, {"error": str(e)}
+
+    async def _mutate(self, name, operation):
+        # one operation per roulette at a time, off the event loop
+        async with self.locks[name]:
+            roulette = self.roulettes[name]
+            loop = asyncio.get_running_loop()
+            result, snapshot = await loop.run_in_executor(
+                None, _run_and_snapshot, roulette, operation
+            )
+            self.snapshots[name] = snapshot
+        return snapshot if result is None else result
+
+
+def _run_and_snapshot(roulette, operation):
+    from coffee_roulette.history import round_pairings
+
+    try:
+        result = operation(roulette)
+    except BaseException:
+        # the next operation must not commit what this one left behind
+        roulette.reload()
+        raise
+    with roulette.lock(shared=True):
+        removed = roulette.removed
+        participants = [
+            {"id": int(p_id), "name": name, "active": p_id not in removed}
+            for p_id, (name, _) in roulette.participants.items()
+        ]
+        pairs, sitout = round_pairings(roulette)
+    snapshot = {
+        "participants": participants,
+        "last-round": {"pairs": pairs, "sitout": sitout},
+    }
+    return result, snapshot
+
+
+def _no_op(roulette):
+    return None
+
+
+def _update_participants(roulette, body):
+    result = {}
+    if body.get("add"):
+        result["add"] = roulette.add_participants(body["add"]).as_dict()
+    if body.get("remove"):
+        result["remove"] = roulette.remove_participants(
+            body["remove"]
+        ).as_dict()
+    return result
+
+
+async def start_server(service, host="127.0.0.1", port=8765, path=None):
+    """
+    Starts serving service over HTTP on host:port, or on the Unix
+    socket path if given, once every roulette is loaded
+
+    RETURNS
+    -------------
+        server : asyncio.Server
+    """
+
+    async def on_connection(reader, writer):
+        try:
+            method, target, body = await _read_request(reader)
+            status, response = await service.handle(method, target, body)
+        except (ValueError, asyncio.IncompleteReadError) as e:
+            status, response = 400, {"error": str(e)}
+        except Exception as e:
+            logger.exception("Request failed")
+            status, response = 500, {"error": str(e)}
+        data = json.dumps(response).encode()
+        writer.write(
+            f"HTTP/1.1 {status} {_REASONS.get(status, '')}\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(data)}\r\n"
+            f"Connection: close\r\n\r\n".encode() + data
+        )
+        await writer.drain()
+        writer.close()
+
+    await service.start()
+    if path != None:
+        return await asyncio.start_unix_server(on_connection, path=path)
+    return await asyncio.start_server(on_connection, host, port)
+
+
+def serve(cfg_paths=None, root=None, host="127.0.0.1", port=8765, path=None):
+    """
+    Runs the service until interrupted, see the module docstring
+    """
+
+    async def main():
+        service = RouletteService(cfg_paths=cfg_paths, root=root)
+        server = await start_server(service, host, port, path)
+        logger.info(
+            f"Serving {len(service.roulettes)} roulette(s) on {path or f'http://{host}:{port}'}"
+        )
+        async with server:
+            await server.serve_forever()
+
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
+
+
+async def request(method, path, body=None, host="127.0.0.1", port=8765):
+    """
+    Minimal client for the service, e.g. for tests and scripts
+
+    RETURNS
+    -------------
+        status : int
+        response : decoded JSON
+    """
+    reader, writer = await asyncio.open_connection(host, port)
+    data = json.dumps(body).encode() if body != None else b""
+    writer.write(
+        f"{method} {path} HTTP/1.1\r\nHost: {host}\r\n"
+        f"Content-Type: application/json\r\n"
+        f"Content-Length: {len(data)}\r\n\r\n".encode() + data
+    )
+    await writer.drain()
+    status_line = await reader.readline()
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        key, _, value = line.decode().partition(":")
+        if key.lower() == "content-length":
+            length = int(value)
+    response = await reader.readexactly(length)
+    writer.close()
+    return int(status_line.split()[1]), json.loads(response)
+
+
+async def _read_request(reader):
+    request_line = (await reader.readline()).decode().split()
+    if len(request_line) != 3:
+        raise ValueError("Malformed request line")
+    method, target, _ = request_line
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        key, _, value = line.decode().partition(":")
+        if key.strip().lower() == "content-length":
+            length = int(value)
+    body = None
+    if length:
+        body = json.loads(await reader.readexactly(length))
+    return method, target, body
+
+
+_REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    500: "Internal Server Error",
+    503: "Service Unavailable",
+}
@@ -0,0 +1,376 @@
+import functools
+from pathlib import Path
+from coffee_roulette import utils
+from coffee_roulette.locking import (
+    ProjectLock,
+    ConflictError,
+    read_version,
+    write_version,
+)
+from coffee_roulette.backends import get_backend, _file_stamp
+from coffee_roulette.starters import ConversationStarters
+from coffee_roulette.names import NameIndex
+
+
+class Roulette:
+    """
+    A coffee roulette project directory held in memory.
+
+    The config, the met matrix, the participant dictionaries and the
+    conversation starters are each loaded the first time they are used
+    and reused afterwards. A cached component is reloaded only if its
+    stored copy has changed since it was read and it has no unsaved
+    changes. commit() writes the components marked as changed and
+    nothing else.
+
+    Components are stored by the backend named by the config's
+    "storage_backend" entry ("files" by default or "sqlite"), see
+    coffee_roulette.backends. The "met_storage" entry chooses between
+    the packed N x N matrix ("dense", default) and a list of met pairs
+    ("sparse") for very large roulettes.
+
+    All public functions accept a Roulette in place of cfg_path, so a
+    batch of operations can share one session:
+
+        with Roulette(cfg_path) as roulette:
+            roulette.add_participants(["Ada", "Alan"])
+            roulette.get_pairs()
+
+    Operations hold the project lock (see coffee_roulette.locking) from
+    loading to saving, so concurrent processes take turns. Every commit
+    increments the project's version; if another process has committed
+    since this session loaded the roulette and it has unsaved changes,
+    commit() raises ConflictError and the caller can reload() and retry.
+
+    PARAMETERS
+    -------------
+        cfg_path : string
+            Full path to the config.yaml file
+        lock_timeout : float, optional
+            Seconds to wait for the project lock
+            Defaults to None (wait indefinitely)
+    """
+
+    def __init__(self, cfg_path, lock_timeout=None):
+        self.cfg_path = Path(cfg_path).resolve()
+        self._lock = ProjectLock(self.cfg_path.parent, timeout=lock_timeout)
+        self._version = None
+        self._cache = {}
+        self._dirty = set()
+        self._backend = None
+        self._starter_index = None
+        self._name_index = None
+        self._io = {}
+
+    def __repr__(self):
+        return f"Roulette({str(self.cfg_path)!r})"
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.commit()
+
+    # ---- components ----
+
+    @property
+    def config(self):
+        return self._get("config")
+
+    @property
+    def roulette_dir(self):
+        return Path(self.config["roulette_directory"]).resolve()
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            self._backend = get_backend(
+                self.config.get("storage_backend"),
+                self.roulette_dir,
+                met_storage=self.config.get("met_storage"),
+            )
+        return self._backend
+
+    def io_counters(self):
+        """
+        Bytes (and, with the SQLite backend, rows) read and written by
+        this session so far
+        """
+        counters = dict(self._io)
+        if self._backend is not None:
+            for key, value in self._backend.io.items():
+                counters[key] = counters.get(key, 0) + value
+        return counters
+
+    @property
+    def met(self):
+        """
+        MetMatrix of who has met whom
+        """
+        return self._get("met")
+
+    @met.setter
+    def met(self, value):
+        self._set("met", value)
+
+    @property
+    def participants(self):
+        """
+        Dictionary of participant id -> (name, [conversation starter ids])
+        """
+        return self._get("participants")
+
+    @participants.setter
+    def participants(self, value):
+        self._set("participants", value)
+
+    @property
+    def removed(self):
+        """
+        Dictionary of removed participant id -> (name, [conversation starter ids])
+        """
+        return self._get("removed")
+
+    @removed.setter
+    def removed(self, value):
+        self._set("removed", value)
+
+    @property
+    def schedule(self):
+        """
+        List of precomputed rounds, see coffee_roulette.schedule
+        """
+        return self._get("schedule")
+
+    @schedule.setter
+    def schedule(self, value):
+        self._set("schedule", value)
+
+    @property
+    def labels(self):
+        """
+        Labels of participant attributes, see coffee_roulette.constraints
+        """
+        return self._get("labels")
+
+    @labels.setter
+    def labels(self, value):
+        self._set("labels", value)
+
+    @property
+    def conversation_starters(self):
+        """
+        List of conversation starter lines
+        """
+        return self._get("starters")
+
+    @property
+    def starter_index(self):
+        """
+        ConversationStarters index built from the current conversation
+        starters and participant histories
+        """
+        lines = self.conversation_starters
+        participants = self.participants
+        index = self._starter_index
+        if (
+            index is None
+            or index.crParticipantDict is not participants
+            or index.source is not lines
+        ):
+            index = ConversationStarters(lines, participants)
+            self._starter_index = index
+        return index
+
+    @property
+    def name_index(self):
+        """
+        NameIndex of the current participants, kept for the session
+        """
+        participants = self.participants
+        prefix = self.config.get("name_prefix") or ""
+        index = self._name_index
+        if (
+            index is None
+            or index.crParticipantDict is not participants
+            or index.size != len(participants)
+            or index.prefix != prefix
+        ):
+            index = NameIndex(participants, prefix=prefix)
+            self._name_index = index
+        return index
+
+    @property
+    def version(self):
+        """
+        Version of the roulette as stored, incremented by every commit
+        """
+        return read_version(self.cfg_path.parent)
+
+    def lock(self, shared=False):
+        """
+        Context manager holding the project lock, exclusive by default.
+
+        Taking it with no unsaved changes brings the session up to date
+        with the stored version, since the components are revalidated
+        on their next use anyway.
+        """
+        if not self._lock.held and not self._dirty:
+            self._version = None
+        return self._lock(shared=shared)
+
+    def mark_dirty(self, *components):
+        """
+        Flags components that were modified in place so that commit()
+        writes them
+
+        PARAMETERS
+        -------------
+            components : strings
+                Any of "config", "met", "participants", "removed",
+                "schedule", "labels"
+        """
+        for component in components:
+            if component not in self._components:
+                raise ValueError(f"Unknown component '{component}'!")
+            if component in self._cache:
+                self._dirty.add(component)
+
+    def commit(self):
+        """
+        Writes the components that have changed since they were loaded.
+
+        Raises ConflictError if the stored roulette has been committed
+        by someone else since this session loaded it.
+        """
+        if not self._dirty:
+            return
+        with self.lock():
+            version = self.version
+            if self._version != None and version != self._version:
+                raise ConflictError(
+                    f"{self.cfg_path.parent.name} was changed by another process (version {self._version} -> {version})! Reload and try again."
+                )
+            self._commit()
+            self._version = version + 1
+            write_version(self.cfg_path.parent, self._version)
+
+    def _commit(self):
+        if "config" in self._dirty:
+            utils.write_config(self.cfg_path, self.config)
+            self._cache["config"] = (_file_stamp(self.cfg_path), self.config)
+            self._dirty.discard("config")
+            self._close_backend()
+        components = {c: self._cache[c][1] for c in self._dirty}
+        if components:
+            self.backend.save(components)
+        for component, value in components.items():
+            self._cache[component] = (self._stamp(component), value)
+        self._dirty.clear()
+
+    def reload(self):
+        """
+        Drops all cached components, discarding unsaved changes
+        """
+        self._cache.clear()
+        self._dirty.clear()
+        self._version = None
+        self._close_backend()
+        self._starter_index = None
+        self._name_index = None
+
+    # ---- operations ----
+
+    def get_pairs(self, **kwargs):
+        from coffee_roulette import get_pairs
+
+        return get_pairs(self, **kwargs)
+
+    def add_participants(self, participants, labels=None):
+        from coffee_roulette.modify import add_participants
+
+        return add_participants(self, participants, labels=labels)
+
+    def remove_participants(self, participants):
+        from coffee_roulette.modify import remove_participants
+
+        return remove_participants(self, participants)
+
+    def print_participants(self):
+        from coffee_roulette.modify import print_participants
+
+        return print_participants(self)
+
+    # ---- loading and saving ----
+
+    _components = (
+        "config",
+        "met",
+        "participants",
+        "removed",
+        "schedule",
+        "labels",
+    )
+
+    def _stamp(self, component):
+        if component == "config":
+            return _file_stamp(self.cfg_path)
+        return self.backend.stamp(component)
+
+    def _load(self, component):
+        if component == "config":
+            return utils.read_config(self.cfg_path)
+        return self.backend.load(component)
+
+    def _get(self, component):
+        if component in self._dirty:
+            return self._cache[component][1]
+        if self._version is None:
+            self._version = self.version
+        cached = self._cache.get(component)
+        if cached is None or cached[0] != self._stamp(component):
+            value = self._load(component)
+            # stamp after loading, which may have migrated the file
+            cached = (self._stamp(component), value)
+            self._cache[component] = cached
+        return cached[1]
+
+    def _close_backend(self):
+        # keep the I/O counted so far when the backend is reopened
+        self._io = self.io_counters()
+        if self._backend is not None:
+            self._backend.close()
+        self._backend = None
+
+    def _set(self, component, value):
+        self._cache[component] = (None, value)
+        self._dirty.add(component)
+
+
+def locked(shared=False):
+    """
+    Decorator for operations taking cfg_path (or a Roulette) as first
+    argument: opens the session and holds the project lock while the
+    operation runs
+    """
+
+    def decorator(operation):
+        @functools.wraps(operation)
+        def wrapper(cfg_path, *args, **kwargs):
+            roulette = open_roulette(cfg_path)
+            with roulette.lock(shared=shared):
+                return operation(roulette, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def open_roulette(cfg_path):
+    """
+    Returns cfg_path if it already is a Roulette, otherwise opens one
+    """
+    if isinstance(cfg_path, Roulette):
+        return cfg_path
+    return Roulette(cfg_path)
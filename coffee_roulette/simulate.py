@@ -0,0 +1,294 @@
+import numpy as np
+from coffee_roulette.matching import match_round, _augment_matching
+from coffee_roulette.session import open_roulette
+from coffee_roulette.constraints import PairingConstraints
+
+
+class Forecast:
+    """
+    Outcome of simulate_roulette().
+
+    ATTRIBUTES
+    -------------
+        rounds_to_exhaustion : 1D int array
+            For every trial, the number of rounds drawn before the first
+            round in which someone had to repeat a partner (rounds if
+            that never happened)
+        repeats : 2D int array
+            Repeated pairs per trial (rows) and round (columns)
+        sitouts : 2D int array
+            Rounds sat out per trial (rows) and participant (columns);
+            columns beyond the initial participants are people added
+            during the simulation
+    """
+
+    def __init__(self, rounds_to_exhaustion, repeats, sitouts):
+        self.rounds_to_exhaustion = rounds_to_exhaustion
+        self.repeats = repeats
+        self.sitouts = sitouts
+
+    def __repr__(self):
+        return f"Forecast({self.summary()!r})"
+
+    def summary(self):
+        """
+        Distribution of the rounds to exhaustion (mean, median, 10th
+        and 90th percentile), the mean number of repeated pairs per
+        trial and the mean difference between the most and least
+        sat-out participants
+        """
+        exhaustion = self.rounds_to_exhaustion
+        return {
+            "trials": int(exhaustion.shape[0]),
+            "rounds": int(self.repeats.shape[1]),
+            "exhaustion_mean": float(exhaustion.mean()),
+            "exhaustion_median": float(np.median(exhaustion)),
+            "exhaustion_p10": float(np.percentile(exhaustion, 10)),
+            "exhaustion_p90": float(np.percentile(exhaustion, 90)),
+            "repeats_mean": float(self.repeats.sum(axis=1).mean()),
+            "sitout_spread": float(
+                (self.sitouts.max(axis=1) - self.sitouts.min(axis=1)).mean()
+            ),
+        }
+
+
+def simulate_roulette(
+    cfg_path=None,
+    participants=None,
+    trials=200,
+    rounds=None,
+    changes=None,
+    engine="batched",
+    seed=None,
+    batch_bytes=2**26,
+):
+    """
+    Forecasts how many rounds a roulette can run before unique pairings
+    run out, entirely in memory.
+
+    Many independent trials of future rounds are simulated from the
+    current state of a roulette (or from a new one). With the default
+    "batched" engine, every round of all trials in a batch is drawn at
+    once by the most-constrained-first greedy matching of
+    greedy_matching(), vectorized over the trials, and completed with
+    augmenting paths like maximum_matching(), so the forecast matches
+    what get_pairs() achieves. Any registered engine can be used
+    instead, one trial at a time. Nothing is written to the project
+    directory.
+
+    PARAMETERS
+    -------------
+        cfg_path : string or Roulette, optional
+            Roulette to start from (its active participants, who has met
+            whom and its pairing constraints)
+        participants : int, optional
+            Number of participants of a new roulette, if no cfg_path
+        trials : int, optional
+            Number of independent trials
+            Defaults to 200
+        rounds : int, optional
+            Number of rounds per trial
+            Defaults to the number of participants (after changes)
+        changes : dict, optional
+            Round index -> (number added, number removed) before that
+            round, e.g. {4: (3, 0), 8: (0, 2)}; removed participants are
+            drawn at random in every trial
+        engine : string, optional
+            "batched" (default, a vectorized equivalent of "maximum")
+            or the name of a registered matching engine, see
+            coffee_roulette.matching
+        seed : int or numpy.random.Generator, optional
+        batch_bytes : int, optional
+            Approximate memory for the trials simulated at once
+
+    RETURNS
+    -------------
+        forecast : Forecast
+    """
+    rng = np.random.default_rng(seed)
+    changes = dict(changes or {})
+    if cfg_path != None:
+        roulette = open_roulette(cfg_path)
+        with roulette.lock(shared=True):
+            active = np.setdiff1d(
+                np.arange(roulette.met.n), list(roulette.removed)
+            )
+            met = ~roulette.met.unmet_submatrix(active)
+            constraints = PairingConstraints.from_roulette(roulette)
+            if constraints != None:
+                # pairs the constraints rule out count as met: they are
+                # only drawn, as repeats, when nothing else is left
+                met |= ~constraints.allowed_submatrix(active)
+    elif participants != None:
+        met = np.eye(participants, dtype=bool)
+    else:
+        raise ValueError("Pass either cfg_path or participants!")
+
+    n = met.shape[0]
+    size = n + sum(added for added, _ in changes.values())
+    if rounds == None:
+        rounds = size - sum(removed for _, removed in changes.values())
+    per_trial = size * size + 64 * size
+    batch = max(1, min(trials, batch_bytes // per_trial))
+
+    results = [
+        _simulate_batch(
+            met, min(batch, trials - start), size, rounds, changes, engine, rng
+        )
+        for start in range(0, trials, batch)
+    ]
+    repeats = np.concatenate([r[0] for r in results])
+    sitouts = np.concatenate([r[1] for r in results])
+    exhausted = repeats > 0
+    rounds_to_exhaustion = np.where(
+        exhausted.any(axis=1), exhausted.argmax(axis=1), rounds
+    )
+    return Forecast(rounds_to_exhaustion, repeats, sitouts)
+
+
+def sweep_team_sizes(sizes, **kwargs):
+    """
+    Runs simulate_roulette() for new roulettes of every size in sizes
+
+    PARAMETERS
+    -------------
+        sizes : iterable of ints
+        **kwargs
+            Passed on to simulate_roulette()
+
+    RETURNS
+    -------------
+        summaries : dict
+            Team size -> Forecast.summary()
+    """
+    return {
+        int(n): simulate_roulette(participants=int(n), **kwargs).summary()
+        for n in sizes
+    }
+
+
+def _simulate_batch(initial_met, trials, size, rounds, changes, engine, rng):
+    n = initial_met.shape[0]
+    met = np.zeros((trials, size, size), dtype=bool)
+    met[:, :n, :n] = initial_met
+    met[:, np.arange(size), np.arange(size)] = True
+    active = np.zeros((trials, size), dtype=bool)
+    active[:, :n] = True
+    repeats = np.zeros((trials, rounds), dtype=int)
+    sitouts = np.zeros((trials, size), dtype=int)
+    t = np.arange(trials)
+
+    for r in range(rounds):
+        if r in changes:
+            added, removed = changes[r]
+            active[:, n : n + added] = True
+            n += added
+            for _ in range(removed):
+                keys = np.where(active, rng.random(active.shape), -1)
+                active[t, keys.argmax(axis=1)] = False
+
+        if engine == "batched":
+            partner = _batched_matching(met, active, rng)
+        else:
+            partner = np.full((trials, size), -1)
+            for k in range(trials):
+                ids = np.flatnonzero(active[k])
+                pairs, _, _ = match_round(
+                    ~met[k][np.ix_(ids, ids)], engine=engine, rng=rng
+                )
+                for i, j in pairs:
+                    partner[k, ids[i]], partner[k, ids[j]] = ids[j], ids[i]
+
+        # pair up whoever is left over; one of an odd number sits out
+        left = active & (partner < 0)
+        count = left.sum(axis=1)
+        order = np.argsort(np.where(left, rng.random(left.shape), 2), axis=1)
+        for m in range(int(count.max(initial=0)) // 2):
+            a, b = order[:, 2 * m], order[:, 2 * m + 1]
+            valid = 2 * m + 1 < count
+            partner[t[valid], a[valid]] = b[valid]
+            partner[t[valid], b[valid]] = a[valid]
+        repeats[:, r] = count // 2
+        odd = count % 2 == 1
+        sitouts[t[odd], order[odd, count[odd] - 1]] += 1
+
+        k, i = np.nonzero(partner >= 0)
+        met[k, i, partner[k, i]] = True
+    return repeats, sitouts
+
+
+def _batched_matching(met, active, rng):
+    """
+    Matching of every trial at once that mirrors greedy_matching() and
+    maximum_matching(): the free participant with the fewest unmet
+    free partners is paired first (vectorized over the trials), then
+    participants left over are rescued by augmenting paths, first the
+    short ones found by swapping partners with a matched pair and, if
+    some remain, a full search per trial
+    """
+    trials, size = active.shape
+    t = np.arange(trials)
+    allowed = ~met & active[:, None, :] & active[:, :, None]
+    free = active.copy()
+    partner = np.full((trials, size), -1)
+    degree = allowed.sum(axis=2)
+    priority = degree + rng.random((trials, size))
+    for _ in range(size // 2):
+        keys = np.where(free & (degree > 0), priority, np.inf)
+        u = keys.argmin(axis=1)
+        ok = np.isfinite(keys[t, u])
+        if not ok.any():
+            break
+        k, u = t[ok], u[ok]
+        candidates = allowed[k, u] & free[k]
+        v = np.where(candidates, priority[k], np.inf).argmin(axis=1)
+        partner[k, u], partner[k, v] = v, u
+        free[k, u] = free[k, v] = False
+        # the free partners of u and v lose a candidate
+        lost = (allowed[k, u] & free[k]).astype(int) + (
+            allowed[k, v] & free[k]
+        )
+        degree[k] -= lost
+        priority[k] -= lost
+
+    for k in np.flatnonzero((active & (partner < 0)).sum(axis=1) > 1):
+        _augment_trial(allowed[k], partner[k], rng)
+    return partner
+
+
+def _augment_trial(allowed, partner, rng):
+    # u - x = y - v becomes u - x, y - v for leftovers u and v
+    left = np.flatnonzero((partner < 0) & allowed.any(axis=1)).tolist()
+    swapped = True
+    while swapped and len(left) > 1:
+        swapped = False
+        for a in range(len(left)):
+            for b in range(a + 1, len(left)):
+                u, v = left[a], left[b]
+                matched = partner >= 0
+                x = np.flatnonzero(
+                    allowed[u] & matched & allowed[v][np.maximum(partner, 0)]
+                )
+                if x.shape[0] == 0:
+                    continue
+                x = rng.choice(x)
+                y = partner[x]
+                partner[u], partner[x] = x, u
+                partner[v], partner[y] = y, v
+                left.remove(u)
+                left.remove(v)
+                swapped = True
+                break
+            if swapped:
+                break
+    if len(left) > 1:
+        # longer augmenting paths: exact search
+        ids = np.flatnonzero(allowed.any(axis=1) | (partner >= 0))
+        match = np.full(ids.shape[0], -1)
+        position = np.full(partner.shape[0], -1)
+        position[ids] = np.arange(ids.shape[0])
+        paired = partner[ids] >= 0
+        match[paired] = position[partner[ids[paired]]]
+        match = _augment_matching(allowed[np.ix_(ids, ids)], match, rng)
+        paired = match >= 0
+        partner[ids[paired]] = ids[match[paired]]
@@ -0,0 +1,94 @@
+import numpy as np
+
+
+class ConversationStarters:
+    """
+    Conversation starters indexed for a whole round at a time.
+
+    The starters each participant has already been given are kept as a
+    bitset (one bit per starter, packed 8 per byte), built once from the
+    participant dictionary. assign() picks a starter for every pair of a
+    round in one batched operation on the bitwise OR of the partners'
+    sets and records it in both the bitset and the participant
+    dictionary.
+
+    PARAMETERS
+    -------------
+        lines : list of strings
+            Conversation starters, one per line
+        crParticipantDict : dict
+            Participant id -> (name, [conversation starter ids])
+    """
+
+    def __init__(self, lines, crParticipantDict):
+        self.source = lines
+        self.lines = [line.rstrip("\n") for line in lines]
+        self.crParticipantDict = crParticipantDict
+        size = max(crParticipantDict, default=-1) + 1
+        self.used = np.zeros(
+            (size, (len(self.lines) + 7) // 8), dtype=np.uint8
+        )
+        ids = [
+            (p_id, q_id)
+            for p_id, (_, history) in crParticipantDict.items()
+            for q_id in history
+            if q_id < len(self.lines)
+        ]
+        if ids:
+            p_ids, q_ids = np.asarray(ids, dtype=np.intp).T
+            self._mark(p_ids, q_ids)
+
+    def __len__(self):
+        return len(self.lines)
+
+    def assign(self, i, j, rng=None):
+        """
+        Picks a starter that neither partner has had for every pair
+        (i[k], j[k]) and records it.
+
+        PARAMETERS
+        -------------
+            i, j : arrays of ints
+                Participant ids of the two partners of each pair
+            rng : numpy.random.Generator, int or None, optional
+
+        RETURNS
+        -------------
+            q_ids : 1D int array
+                Starter id for every pair, -1 if none is left
+        """
+        rng = np.random.default_rng(rng)
+        i = np.asarray(i, dtype=np.intp)
+        j = np.asarray(j, dtype=np.intp)
+        if i.shape[0] == 0 or len(self.lines) == 0:
+            return np.full(i.shape[0], -1)
+        self._grow(max(i.max(), j.max()) + 1)
+
+        available = ~np.unpackbits(
+            self.used[i] | self.used[j], axis=1, count=len(self.lines)
+        ).astype(bool)
+        # random key per available starter; the largest one wins
+        keys = np.where(available, rng.random(available.shape), -1)
+        q_ids = keys.argmax(axis=1)
+        q_ids[~available.any(axis=1)] = -1
+
+        assigned = q_ids >= 0
+        self._mark(i[assigned], q_ids[assigned])
+        self._mark(j[assigned], q_ids[assigned])
+        for a, b, q_id in zip(i[assigned], j[assigned], q_ids[assigned]):
+            self.crParticipantDict[a][1].append(int(q_id))
+            self.crParticipantDict[b][1].append(int(q_id))
+        return q_ids
+
+    def _mark(self, p_ids, q_ids):
+        np.bitwise_or.at(
+            self.used,
+            (p_ids, q_ids >> 3),
+            (np.uint8(0x80) >> (q_ids & 7)).astype(np.uint8),
+        )
+
+    def _grow(self, size):
+        if size > self.used.shape[0]:
+            used = np.zeros((size, self.used.shape[1]), dtype=np.uint8)
+            used[: self.used.shape[0]] = self.used
+            self.used = used
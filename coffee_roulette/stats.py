@@ -0,0 +1,78 @@
+import time
+import logging
+import contextlib
+
+logger = logging.getLogger(__name__)
+
+
+class RunStats:
+    """
+    Timings and counters of one roulette operation.
+
+    Returned by get_pairs(), add_participants() and
+    remove_participants(). Every phase of the operation (e.g. "load",
+    "match", "save") is timed separately; counters hold quantities such
+    as the number of pairs, the matrix size and the bytes read and
+    written by the storage backend.
+
+    The stats are also logged at DEBUG level to the
+    "coffee_roulette.stats" logger and passed to the on_stats callback
+    of the operation, if given.
+    """
+
+    def __init__(self, operation):
+        self.operation = operation
+        self.phases = {}
+        self.counters = {}
+
+    def __repr__(self):
+        return f"RunStats({self.as_dict()!r})"
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """
+        Times the enclosed block as phase name
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = (
+                self.phases.get(name, 0.0) + time.perf_counter() - start
+            )
+
+    @property
+    def total(self):
+        return sum(self.phases.values())
+
+    def as_dict(self):
+        return {
+            "operation": self.operation,
+            "total_s": self.total,
+            "phases_s": dict(self.phases),
+            **self.counters,
+        }
+
+    @contextlib.contextmanager
+    def track_io(self, roulette):
+        """
+        Adds the storage I/O of roulette during the enclosed block to
+        the counters
+        """
+        before = roulette.io_counters()
+        try:
+            yield
+        finally:
+            for key, value in roulette.io_counters().items():
+                self.counters[key] = (
+                    self.counters.get(key, 0) + value - before.get(key, 0)
+                )
+
+    def finish(self, on_stats=None):
+        """
+        Logs the stats, calls on_stats(stats) and returns the stats
+        """
+        logger.debug("%s", self.as_dict())
+        if on_stats != None:
+            on_stats(self)
+        return self
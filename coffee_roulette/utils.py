@@ -1,8 +1,10 @@
 import os
+import logging
 import numpy as np
-from ruamel.yaml import YAML
 from pathlib import Path
 
+logger = logging.getLogger(__name__)
+
 
 def create_config_template():
     """
@@ -19,13 +21,21 @@ def create_config_template():
         roulette_frequency:
         roulette_times:
         time_spacing:
+        pairing_constraints:
         \n
     # Printing parameters
         name_prefix: 
         meeting_purpose:
+        \n
+    # Storage parameters
+        storage_backend:
+        met_storage:
+        compact_threshold:
         \n    
     """
 
+    from ruamel.yaml import YAML
+
     ruamelFile = YAML()
     cfg_file = ruamelFile.load(yaml_str)
     return cfg_file, ruamelFile
@@ -35,6 +45,8 @@ def read_config(cfg_path):
     """
     Reads the roulette config file
     """
+    from ruamel.yaml import YAML
+
     ruamelFile = YAML()
     cfg_path = Path(cfg_path)
     if os.path.exists(cfg_path):
@@ -49,7 +61,9 @@ def write_config(cfg_path, cfg):
     """
     Writes the roulette config file
     """
-    with open(cfg_path, "w") as f:
+    from coffee_roulette.locking import atomic_write
+
+    with atomic_write(cfg_path, "w") as f:
         cfg_file, ruamelFile = create_config_template()
         for key in cfg.keys():
             cfg_file[key] = cfg[key]
@@ -63,7 +77,7 @@ def edit_config(cfg_path, edits):
         # TODO
 
 
-def get_meeting_times(bounds, spacing):
+def get_meeting_times(bounds, spacing, verbose=True):
     """
     Generates a list of meeting times given time slot bounds
     and meeting spacings
@@ -75,6 +89,8 @@ def get_meeting_times(bounds, spacing):
         = meeting slots 9-12 and 13-17
     spacing : int
         meeting spacing in minutes
+    verbose : bool, optional
+        whether to log how the bounds were interpreted
 
     """
     bounds = np.asarray(bounds)
@@ -97,10 +113,12 @@ def get_meeting_times(bounds, spacing):
     # check that bounds notation is consistent
     item_lengths = np.asarray([len(str(x)) for b in bounds for x in b])
     if np.all(item_lengths <= 2):
-        print("Nice! Bounds are defined in full hours!")
+        if verbose:
+            logger.info("Nice! Bounds are defined in full hours!")
         bounds = bounds.astype(np.float64)
     elif np.all((item_lengths > 2) & (item_lengths <= 4)):
-        print("Nice! Bounds are defined in hours and minutes!")
+        if verbose:
+            logger.info("Nice! Bounds are defined in hours and minutes!")
         bounds = bounds // 100 + bounds % 100 / 60
     else:
         raise ValueError(
@@ -0,0 +1,58 @@
+import sqlite3
+import pytest
+import numpy as np
+from coffee_roulette import create_coffee_roulette, Roulette
+from coffee_roulette.backends import migrate_to_sqlite
+
+
+def run_rounds(cfg_path):
+    with Roulette(cfg_path) as roulette:
+        for seed in range(3):
+            roulette.get_pairs(random_time=False, seed=seed)
+        roulette.add_participants(["new"])
+        roulette.remove_participants(["p1"])
+        roulette.get_pairs(random_time=False, seed=3)
+        return roulette.met.met_rows(np.arange(9)), roulette.participants
+
+
+def test_sqlite_backend_matches_files(tmp_path):
+    results = []
+    for backend in ["files", "sqlite"]:
+        create_coffee_roulette(
+            backend,
+            working_dir=tmp_path,
+            participants=[f"p{i}" for i in range(8)],
+            storage_backend=backend,
+        )
+        cfg_path = tmp_path / f"CoffeeRoulette-{backend}" / "config.yaml"
+        run_rounds(cfg_path)
+        reopened = Roulette(cfg_path)
+        assert list(reopened.removed) == [1]
+        results.append(
+            (reopened.met.met_rows(np.arange(9)), reopened.participants)
+        )
+
+    assert np.array_equal(results[0][0], results[1][0])
+    assert results[0][1] == results[1][1]
+
+    migrate_to_sqlite(tmp_path / "CoffeeRoulette-files" / "config.yaml")
+    migrated = Roulette(tmp_path / "CoffeeRoulette-files" / "config.yaml")
+    assert migrated.backend.name == "sqlite"
+    assert np.array_equal(migrated.met.met_rows(np.arange(9)), results[0][0])
+    assert migrated.participants == results[0][1]
+
+
+def test_reload_closes_sqlite_connection(tmp_path):
+    create_coffee_roulette(
+        "s",
+        working_dir=tmp_path,
+        participants=["a", "b"],
+        storage_backend="sqlite",
+    )
+    roulette = Roulette(tmp_path / "CoffeeRoulette-s" / "config.yaml")
+    connection = roulette.backend.connection
+    assert len(roulette.participants) == 2
+    roulette.reload()
+    with pytest.raises(sqlite3.ProgrammingError):
+        connection.execute("SELECT 1")
+    assert len(roulette.participants) == 2
@@ -0,0 +1,20 @@
+from coffee_roulette import create_coffee_roulette
+from coffee_roulette.batch import run_roulettes
+
+
+def test_run_roulettes_reports_failures(tmp_path):
+    for name in ["a", "b", "c"]:
+        create_coffee_roulette(
+            name, working_dir=tmp_path, participants=["x", "y", "z", "w"]
+        )
+
+    results = run_roulettes(
+        cfg_paths=[tmp_path / "missing.yaml"],
+        root=tmp_path,
+        workers=2,
+        seed=0,
+        random_time=False,
+    )
+    assert [r["ok"] for r in results] == [False, True, True, True]
+    assert "FileNotFoundError" in results[0]["error"]
+    assert results[1]["output"].count("will have coffee") == 2
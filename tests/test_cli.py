@@ -0,0 +1,62 @@
+import subprocess
+import sys
+from coffee_roulette import cli
+from coffee_roulette.session import Roulette
+
+
+def test_cli_round_trip(tmp_path):
+    names = tmp_path / "names.txt"
+    names.write_text("Ada\nAlan\n\nGrace\n")
+    assert (
+        cli.main(["create", "x", "--dir", str(tmp_path), "-f", str(names)])
+        == 0
+    )
+    cfg_path = str(tmp_path / "CoffeeRoulette-x" / "config.yaml")
+
+    assert cli.main(["-q", "add", cfg_path, "Barbara"]) == 0
+    assert cli.main(["-q", "pairs", cfg_path, "--seed", "0"]) == 0
+    assert cli.main(["-q", "remove", cfg_path, "Alan"]) == 0
+
+    roulette = Roulette(cfg_path)
+    assert [name for name, _ in roulette.participants.values()] == [
+        "Ada",
+        "Alan",
+        "Grace",
+        "Barbara",
+    ]
+    assert [name for name, _ in roulette.removed.values()] == ["Alan"]
+    assert roulette.met.met_counts.sum() == 4 + 2 * 2
+
+
+def test_import_is_lazy():
+    code = "import sys, coffee_roulette; print('numpy' in sys.modules)"
+    out = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True
+    )
+    assert out.stdout.strip() == "False"
+
+
+def test_star_import_exports_api():
+    namespace = {}
+    exec("from coffee_roulette import *", namespace)
+    assert callable(namespace["get_pairs"])
+    assert "Roulette" in namespace and "simulate_roulette" in namespace
+
+
+def test_pairs_are_printed_to_stdout(tmp_path):
+    cli.main(["create", "x", "--dir", str(tmp_path), "--participants", "a"])
+    cfg_path = str(tmp_path / "CoffeeRoulette-x" / "config.yaml")
+    cli.main(["-q", "add", cfg_path, "b"])
+
+    def run(*args):
+        return subprocess.run(
+            [sys.executable, "-m", "coffee_roulette", *args],
+            capture_output=True,
+            text=True,
+        )
+
+    out = run("pairs", cfg_path, "--seed", "0")
+    assert "a" in out.stdout and "b" in out.stdout
+    assert out.stderr == ""
+    out = run("remove", cfg_path, "nobody")
+    assert "not found" in out.stderr and "not found" not in out.stdout
@@ -0,0 +1,42 @@
+import numpy as np
+from coffee_roulette import create_coffee_roulette, Roulette
+from coffee_roulette import compact, history
+
+
+def test_compact_roulette(tmp_path):
+    for backend in ["files", "sqlite"]:
+        create_coffee_roulette(
+            backend,
+            working_dir=tmp_path,
+            participants=[f"p{i}" for i in range(10)],
+            storage_backend=backend,
+        )
+        cfg_path = tmp_path / f"CoffeeRoulette-{backend}" / "config.yaml"
+        with Roulette(cfg_path) as roulette:
+            for seed in range(3):
+                roulette.get_pairs(random_time=False, seed=seed)
+            before = roulette.met.met_rows(np.arange(10))
+            roulette.config["compact_threshold"] = 0.3
+            roulette.mark_dirty("config")
+            roulette.remove_participants(["p2", "p5"])
+            assert roulette.met.n == 10
+            stats = roulette.remove_participants(["p7"])
+            assert stats.counters["compacted"]
+
+        roulette = Roulette(cfg_path)
+        kept = [0, 1, 3, 4, 6, 8, 9]
+        assert roulette.met.n == 7 and roulette.removed == {}
+        assert [name for name, _ in roulette.participants.values()] == [
+            f"p{i}" for i in kept
+        ]
+        assert np.array_equal(
+            roulette.met.met_rows(np.arange(7)), before[np.ix_(kept, kept)]
+        )
+        assert compact.current_id(cfg_path, 9) == 6
+        assert compact.current_id(cfg_path, 5) < 0
+
+        # retired participants stay in the history under their names
+        partners = {p for _, _, p in history.meeting_log(cfg_path, "p5")}
+        for partner in partners - {"p2", "p7"}:
+            assert history.last_meeting(cfg_path, partner, "p5") != None
+        roulette.get_pairs(random_time=False, seed=4)
@@ -0,0 +1,110 @@
+import pytest
+import numpy as np
+from coffee_roulette import create_coffee_roulette, Roulette
+from coffee_roulette import set_labels, compact_roulette
+from coffee_roulette.labels import Labels
+from coffee_roulette.constraints import PairingConstraints
+from coffee_roulette.names import NameIndex
+from coffee_roulette.schedule import precompute_schedule
+
+
+def test_constraint_masks():
+    labels = Labels()
+    labels.set("team", [0, 1, 2, 3], ["a", "a", "b", None])
+    labels.set("manager", [1], ["Ada"])
+    participants = {
+        i: (name, []) for i, name in enumerate("Ada Bo Cy Di Ed".split())
+    }
+    constraints = PairingConstraints(
+        [{"different": "team"}, {"not_with": "manager"}],
+        labels,
+        NameIndex(participants),
+    )
+    allowed = constraints.allowed_submatrix(np.arange(5))
+    assert not allowed[0, 1] and not allowed[1, 0]
+    assert allowed[0, 2] and allowed[3, 4] and allowed[0, 4]
+    i, j = np.nonzero(~np.eye(5, dtype=bool))
+    assert np.array_equal(constraints.allowed(i, j), allowed[i, j])
+
+    labels.set("manager", [2], ["Di"])
+    constraints = PairingConstraints(
+        [{"not_with": "manager"}], labels, NameIndex(participants)
+    )
+    assert not constraints.allowed([3], [2])[0]
+
+
+def test_get_pairs_respects_constraints(tmp_path):
+    names = [f"p{i}" for i in range(12)]
+    for backend in ["files", "sqlite"]:
+        create_coffee_roulette(
+            backend,
+            working_dir=tmp_path,
+            participants=names[:10],
+            storage_backend=backend,
+        )
+        cfg_path = tmp_path / f"CoffeeRoulette-{backend}" / "config.yaml"
+        with Roulette(cfg_path) as roulette:
+            roulette.config["pairing_constraints"] = [{"different": "team"}]
+            roulette.mark_dirty("config")
+            set_labels(roulette, "team", {f"p{i}": i % 2 for i in range(10)})
+            # labels of new participants extend the vectors
+            roulette.add_participants(names[10:], labels={"team": ["0", "1"]})
+
+        roulette = Roulette(cfg_path)
+        team = roulette.labels.codes_of("team", np.arange(12))
+        assert team.tolist() == [0, 1] * 6
+        for engine in ["maximum", "sampling"]:
+            before = roulette.met.pairs()
+            stats = roulette.get_pairs(
+                random_time=False, conv_starters=False, engine=engine
+            )
+            assert stats.counters["repeated_pairs"] == 0
+            after = roulette.met.pairs()
+            new = set(zip(*after)) - set(zip(*before))
+            assert len(new) == 6
+            assert all(team[a] != team[b] for a, b in new)
+
+        roulette.remove_participants(["p0", "p3"])
+        compact_roulette(roulette)
+        assert Roulette(cfg_path).labels.values_of("team", [0, 1]) == [
+            "1",
+            "0",
+        ]
+
+
+def test_schedule_respects_constraints(tmp_path):
+    create_coffee_roulette(
+        "s", working_dir=tmp_path, participants=[f"p{i}" for i in range(12)]
+    )
+    cfg_path = tmp_path / "CoffeeRoulette-s" / "config.yaml"
+    roulette = Roulette(cfg_path)
+    roulette.config["pairing_constraints"] = [{"different": "team"}]
+    roulette.mark_dirty("config")
+    set_labels(roulette, "team", {f"p{i}": i % 3 for i in range(12)})
+
+    precompute_schedule(roulette, rounds=4, seed=0)
+    roulette.add_participants(["p12", "p13"], labels={"team": ["0", "1"]})
+    team = roulette.labels.codes_of("team", np.arange(14))
+    for scheduled_round in roulette.schedule:
+        assert len(scheduled_round["pairs"]) >= 6
+        assert all(team[a] != team[b] for a, b in scheduled_round["pairs"])
+
+    stats = roulette.get_pairs(random_time=False, conv_starters=False)
+    assert stats.counters["scheduled_pairs"] >= 6
+
+
+def test_rejected_labels_leave_roulette_unchanged(tmp_path):
+    create_coffee_roulette("r", working_dir=tmp_path, participants=["a", "b"])
+    cfg_path = tmp_path / "CoffeeRoulette-r" / "config.yaml"
+    roulette = Roulette(cfg_path)
+    with pytest.raises(ValueError):
+        roulette.add_participants(["c", "d"], labels={"team": ["0"]})
+    assert roulette.met.n == 2 and len(roulette.participants) == 2
+    assert roulette.name_index.lookup(["c"])[0] == []
+
+    roulette.add_participants(["e"])
+    assert [name for name, _ in Roulette(cfg_path).participants.values()] == [
+        "a",
+        "b",
+        "e",
+    ]
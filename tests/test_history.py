@@ -0,0 +1,73 @@
+import os
+from coffee_roulette import create_coffee_roulette, Roulette
+from coffee_roulette import history
+
+
+def test_history_queries(tmp_path):
+    create_coffee_roulette(
+        "h", working_dir=tmp_path, participants=["A", "B", "C", "D", "E"]
+    )
+    cfg_path = tmp_path / "CoffeeRoulette-h" / "config.yaml"
+    with Roulette(cfg_path) as roulette:
+        round_ids = [
+            roulette.get_pairs(random_time=False, seed=seed).counters[
+                "round_id"
+            ]
+            for seed in range(3)
+        ]
+    assert round_ids == [1, 2, 3]
+
+    pairs, sitout = history.round_pairings(cfg_path, 2)
+    assert len(pairs) == 2 and sitout not in sum(pairs, ())
+    a, b = pairs[0]
+    assert history.last_meeting(cfg_path, a, b)[0] == 2
+    assert sum(n for _, n in history.sitout_counts(cfg_path)) == 3
+    assert len(history.meeting_log(cfg_path, "A")) in (2, 3)
+
+
+def test_import_results(tmp_path):
+    create_coffee_roulette(
+        "h", working_dir=tmp_path, participants=["Ann Lee", "B", "C"]
+    )
+    roulette_dir = tmp_path / "CoffeeRoulette-h"
+    results = roulette_dir / "results"
+    (results / "2024-01-08_crPairings_090000.txt").write_text(
+        "- @Ann Lee will have coffee with @B. Perhaps on Monday, January 08, at 9:00?\n"
+        "C was not paired with anyone this time!\n"
+    )
+    (results / "2024-01-22_crPairings_090000.txt").write_text(
+        "- @B will have coffee with @Ann Lee Suggested conversation starter: Why?\n"
+        "C was not paired with anyone this time!\n"
+    )
+    cfg_path = roulette_dir / "config.yaml"
+    assert history.import_results(cfg_path) == 2
+    assert history.import_results(cfg_path) == 0
+
+    assert history.last_meeting(cfg_path, "B", "Ann Lee") == (2, "2024-01-22")
+    assert history.sitout_counts(cfg_path) == [("C", 2)]
+    with history.MeetingHistory(roulette_dir) as h:
+        assert h.round_pairs(2) == ([(0, 1, 1)], 2)
+    assert os.path.exists(roulette_dir / history.HISTORY_FILE)
+
+
+def test_repeats_recycle_stalest_pairs(tmp_path):
+    create_coffee_roulette(
+        "r", working_dir=tmp_path, participants=[f"p{i}" for i in range(6)]
+    )
+    cfg_path = tmp_path / "CoffeeRoulette-r" / "config.yaml"
+    roulette = Roulette(cfg_path)
+    rounds = []
+    for seed in range(8):
+        stats = roulette.get_pairs(
+            random_time=False, conv_starters=False, seed=seed
+        )
+        pairs, _ = history.round_pairings(roulette, stats.counters["round_id"])
+        rounds.append(sorted(pairs))
+    # after five unique rounds the oldest rounds come back in order
+    assert stats.counters["repeated_pairs"] == 3
+    assert rounds[5] == rounds[0] and rounds[6] == rounds[1]
+
+    with history.MeetingHistory(roulette.roulette_dir) as h:
+        ages = h.pair_ages([0, 1, 2])
+    assert ages.dtype.name == "uint16" and ages[0, 0] == 65535
+    assert 1 <= ages[0, 1] <= 3
@@ -0,0 +1,56 @@
+import multiprocessing
+import pytest
+from coffee_roulette import create_coffee_roulette, Roulette, add_participants
+from coffee_roulette.locking import ConflictError, atomic_write
+
+
+def add_many(cfg_path, prefix):
+    for k in range(5):
+        add_participants(cfg_path, [f"{prefix}{k}"])
+
+
+def test_concurrent_operations_do_not_lose_updates(tmp_path):
+    create_coffee_roulette("l", working_dir=tmp_path, participants=["a", "b"])
+    cfg_path = tmp_path / "CoffeeRoulette-l" / "config.yaml"
+    workers = [
+        multiprocessing.Process(target=add_many, args=(cfg_path, f"w{w}"))
+        for w in range(4)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    roulette = Roulette(cfg_path)
+    assert len(roulette.participants) == roulette.met.n == 22
+    assert roulette.version == 20
+
+
+def test_commit_detects_conflicts(tmp_path):
+    create_coffee_roulette("l", working_dir=tmp_path, participants=["a", "b"])
+    cfg_path = tmp_path / "CoffeeRoulette-l" / "config.yaml"
+    mine, theirs = Roulette(cfg_path), Roulette(cfg_path)
+
+    mine.participants[0] = ("Ada", [])
+    mine.mark_dirty("participants")
+    theirs.add_participants(["c"])
+    with pytest.raises(ConflictError):
+        mine.commit()
+
+    mine.reload()
+    mine.participants[0] = ("Ada", [])
+    mine.mark_dirty("participants")
+    mine.commit()
+    assert Roulette(cfg_path).participants[0][0] == "Ada"
+    assert len(Roulette(cfg_path).participants) == 3
+
+
+def test_atomic_write_keeps_old_file_on_error(tmp_path):
+    path = tmp_path / "file.txt"
+    path.write_text("old")
+    with pytest.raises(RuntimeError):
+        with atomic_write(path, "w") as f:
+            f.write("new")
+            raise RuntimeError
+    assert path.read_text() == "old"
+    assert [p.name for p in tmp_path.iterdir()] == ["file.txt"]
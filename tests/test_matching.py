@@ -0,0 +1,81 @@
+import numpy as np
+from coffee_roulette import matching
+from coffee_roulette.metmatrix import SparseMetMatrix
+
+
+def test_maximum_matching_finds_perfect_matching():
+    # a 6-cycle only admits perfect matchings that greedy can miss
+    allowed = np.zeros((6, 6), dtype=bool)
+    for i in range(6):
+        allowed[i, (i + 1) % 6] = allowed[(i + 1) % 6, i] = True
+
+    for seed in range(20):
+        pairs, repeats, sitout = matching.match_round(allowed, rng=seed)
+        assert len(pairs) == 3 and repeats == [] and sitout == None
+        assert all(allowed[i, j] for i, j in pairs)
+
+
+def test_match_round_reports_repeats():
+    # everyone has met everyone except 0-1
+    allowed = np.zeros((4, 4), dtype=bool)
+    allowed[0, 1] = allowed[1, 0] = True
+
+    pairs, repeats, sitout = matching.match_round(allowed, rng=0)
+    assert pairs == [(0, 1)]
+    assert sorted(repeats[0]) == [2, 3]
+    assert sitout == None
+
+
+def test_sampling_matching_on_sparse_matrix():
+    met = SparseMetMatrix.empty(2000)
+    rng = np.random.default_rng(0)
+    for _ in range(5):
+        order = rng.permutation(2000)
+        met.mark_met(order[0::2], order[1::2])
+
+    ids = np.arange(1, 2000)
+    graph = matching.UnmetGraph(met, ids)
+    pairs, repeats, sitout = matching.match_round(
+        graph, engine="sampling", rng=1
+    )
+    assert len(pairs) == 999 and repeats == [] and sitout != None
+    i, j = np.asarray(pairs).T
+    assert not met.has_met(ids[i], ids[j]).any()
+    assert graph._dense is None
+
+
+def test_greedy_matching_pairs_most_constrained_first():
+    # every even participant can only meet its odd neighbour, while the
+    # odd participants may all meet each other
+    n = 40
+    allowed = np.zeros((n, n), dtype=bool)
+    allowed[1::2, 1::2] = True
+    np.fill_diagonal(allowed, False)
+    allowed[np.arange(0, n, 2), np.arange(1, n, 2)] = True
+    allowed[np.arange(1, n, 2), np.arange(0, n, 2)] = True
+
+    for seed in range(10):
+        match = matching.greedy_matching(allowed, np.random.default_rng(seed))
+        assert np.all(match >= 0)
+        assert np.array_equal(match[match], np.arange(n))
+        assert np.all(allowed[np.arange(n), match])
+
+
+def test_sharded_matching_never_repeats():
+    met = SparseMetMatrix.empty(1000)
+    rng = np.random.default_rng(0)
+    for _ in range(20):
+        order = rng.permutation(1000)
+        met.mark_met(order[0::2], order[1::2])
+
+    graph = matching.UnmetGraph(met, np.arange(1000))
+    for workers in [1, 2]:
+        match = matching.sharded_matching(
+            graph,
+            np.random.default_rng(workers),
+            shard_size=150,
+            workers=workers,
+        )
+        assert np.all(match >= 0)
+        assert np.array_equal(match[match], np.arange(1000))
+        assert not met.has_met(np.arange(1000), match).any()
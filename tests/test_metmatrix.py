@@ -0,0 +1,87 @@
+import os
+import numpy as np
+from coffee_roulette import create_coffee_roulette, Roulette
+from coffee_roulette.metmatrix import MetMatrix, SparseMetMatrix
+
+
+def test_met_matrix_roundtrip(tmp_path):
+    met = MetMatrix.empty(11)
+    met.mark_met([0, 3, 0], [10, 4, 10])
+    assert met.has_met([0, 10, 3, 1], [10, 0, 4, 2]).tolist() == [
+        True,
+        True,
+        True,
+        False,
+    ]
+    assert met.unmet_counts()[[0, 1, 10]].tolist() == [9, 10, 9]
+
+    met.save(tmp_path / "met.npy")
+    loaded = MetMatrix.load(tmp_path / "met.npy", mmap_mode="r+")
+    assert np.array_equal(
+        loaded.met_rows(np.arange(11)), met.met_rows(np.arange(11))
+    )
+    assert np.array_equal(loaded.met_counts, met.met_counts)
+
+
+def test_met_matrix_from_prob_matrix():
+    prob = np.full((4, 4), 1 / 3)
+    np.fill_diagonal(prob, 0)
+    prob[0, 1] = prob[1, 0] = 0
+    prob[[0, 1]] = np.where(prob[[0, 1]] > 0, 1 / 2, 0)
+
+    met = MetMatrix.from_prob_matrix(prob)
+    assert np.allclose(met.probabilities(), prob)
+
+
+def test_met_matrix_grows_geometrically():
+    met = MetMatrix.empty(5)
+    met.mark_met(0, 4)
+    for n in range(6, 40):
+        met.resize(n)
+    assert met.n == 39 and met.capacity >= 39
+    assert met.has_met(0, 4) and not met.has_met(0, 38)
+    assert met.unmet_counts().tolist() == [37] + [38] * 3 + [37] + [38] * 34
+
+
+def test_sparse_met_matrix_matches_dense(tmp_path):
+    rng = np.random.default_rng(0)
+    i, j = rng.integers(30, size=(2, 60))
+    dense = MetMatrix.empty(30)
+    dense.mark_met(i, j)
+    sparse = SparseMetMatrix.empty(30)
+    sparse.mark_met(i, j)
+    sparse.resize(33)
+    dense.resize(33)
+
+    ids = rng.permutation(33)[:20]
+    assert np.array_equal(sparse.met_counts, dense.met_counts)
+    assert np.array_equal(sparse.met_rows(ids), dense.met_rows(ids))
+    assert np.array_equal(
+        sparse.unmet_submatrix(ids), dense.unmet_submatrix(ids)
+    )
+    assert np.array_equal(np.sort(sparse.pairs()), np.sort(dense.pairs()))
+
+    sparse.save(tmp_path / "pairs.npz")
+    loaded = SparseMetMatrix.load(tmp_path / "pairs.npz")
+    assert np.array_equal(loaded.met_rows(ids), dense.met_rows(ids))
+
+
+def test_legacy_project_is_migrated_to_full_size(tmp_path):
+    names = [f"p{i}" for i in range(7)]
+    create_coffee_roulette("legacy", working_dir=tmp_path, participants=names)
+    cfg_path = tmp_path / "CoffeeRoulette-legacy" / "config.yaml"
+    roulette_dir = cfg_path.parent
+    # the old create_coffee_roulette() made a 6 x 6 matrix for 7 people
+    os.remove(roulette_dir / "crMetMatrix.npy")
+    prob = np.full((6, 6), 1 / 5)
+    np.fill_diagonal(prob, 0)
+    prob[0, 1] = prob[1, 0] = 0
+    np.save(roulette_dir / "crProbMatrix.npy", prob)
+
+    roulette = Roulette(cfg_path)
+    assert roulette.met.n == 7
+    assert roulette.met.has_met(0, 1) and not roulette.met.has_met(6, 0)
+    roulette.add_participants(["new1", "new2"])
+    assert [name for name, _ in Roulette(cfg_path).participants.values()] == (
+        names + ["new1", "new2"]
+    )
@@ -0,0 +1,33 @@
+from coffee_roulette import create_coffee_roulette, Roulette
+from coffee_roulette.names import NameIndex, normalize_name
+
+
+def test_name_index_lookup():
+    participants = {
+        0: ("Ada Lovelace", []),
+        1: ("Alan", []),
+        2: ("ada  lovelace", []),
+    }
+    index = NameIndex(participants)
+    assert normalize_name(" @Ada Lovelace ") == "ada lovelace"
+    assert index.lookup(["@ADA LOVELACE", 1, "Grace", 7]) == (
+        [0, 1],
+        ["Grace", 7],
+    )
+    # the removed namesake is skipped
+    assert index.find("ada lovelace", removed={0}) == 2
+
+
+def test_bulk_remove_reports_unknown(tmp_path):
+    names = [f"Person {i}" for i in range(3000)]
+    create_coffee_roulette("n", working_dir=tmp_path, participants=names)
+    cfg_path = tmp_path / "CoffeeRoulette-n" / "config.yaml"
+    with Roulette(cfg_path) as roulette:
+        roulette.add_participants(["Grace"])
+        stats = roulette.remove_participants(
+            [f"@person {i}" for i in range(0, 3000, 2)] + ["grace", "Nobody"]
+        )
+    assert stats.counters["removed"] == 1501
+    assert stats.counters["unknown"] == ["Nobody"]
+    removed = Roulette(cfg_path).removed
+    assert len(removed) == 1501 and removed[3000][0] == "Grace"
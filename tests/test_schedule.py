@@ -0,0 +1,54 @@
+import numpy as np
+from coffee_roulette import create_coffee_roulette, Roulette
+from coffee_roulette import matching
+from coffee_roulette.schedule import precompute_schedule
+
+
+def test_schedule_is_used_and_repaired(tmp_path):
+    create_coffee_roulette(
+        "test", working_dir=tmp_path, participants=[f"p{i}" for i in range(7)]
+    )
+    roulette = Roulette(tmp_path / "CoffeeRoulette-test" / "config.yaml")
+    precompute_schedule(roulette, rounds=6, seed=0)
+
+    pairs = [tuple(sorted(p)) for r in roulette.schedule for p in r["pairs"]]
+    assert len(pairs) == len(set(pairs)) == 18
+
+    first_round = roulette.schedule[0]["pairs"]
+    roulette.get_pairs(random_time=False, conv_starters=False, seed=0)
+    assert len(roulette.schedule) == 5
+    assert all(roulette.met.has_met(a, b) for a, b in first_round)
+
+    roulette.remove_participants(["p0"])
+    roulette.add_participants(["p7", "p8"])
+    for scheduled_round in Roulette(roulette.cfg_path).schedule:
+        ids = np.ravel(scheduled_round["pairs"]).tolist()
+        assert 0 not in ids and len(ids) == len(set(ids))
+        assert not any(
+            roulette.met.has_met(a, b) for a, b in scheduled_round["pairs"]
+        )
+
+
+def test_schedule_never_adds_avoidable_repeats(tmp_path):
+    for k in range(5):
+        create_coffee_roulette(
+            f"h{k}",
+            working_dir=tmp_path,
+            participants=[f"p{i}" for i in range(12)],
+        )
+        roulette = Roulette(tmp_path / f"CoffeeRoulette-h{k}" / "config.yaml")
+        for seed in range(3):
+            roulette.get_pairs(
+                random_time=False, conv_starters=False, seed=seed
+            )
+        precompute_schedule(roulette, rounds=8, seed=k)
+        for seed in range(8):
+            allowed = roulette.met.unmet_submatrix(np.arange(12))
+            match = matching.maximum_matching(
+                allowed, np.random.default_rng(seed)
+            )
+            unavoidable = np.count_nonzero(match < 0) // 2
+            stats = roulette.get_pairs(
+                random_time=False, conv_starters=False, seed=seed
+            )
+            assert stats.counters["repeated_pairs"] <= unavoidable
@@ -0,0 +1,68 @@
+import asyncio
+import pytest
+from coffee_roulette import create_coffee_roulette, Roulette
+from coffee_roulette.service import RouletteService, start_server, request
+
+
+def test_service(tmp_path):
+    for name, backend in [("a", "files"), ("b", "sqlite")]:
+        create_coffee_roulette(
+            name,
+            working_dir=tmp_path,
+            participants=[f"{name}{i}" for i in range(6)],
+            storage_backend=backend,
+        )
+
+    async def main():
+        service = RouletteService(root=tmp_path)
+        server = await start_server(service, port=0)
+        port = server.sockets[0].getsockname()[1]
+
+        async def call(method, path, body=None):
+            return await request(method, path, body, port=port)
+
+        assert await call("GET", "/roulettes") == (200, ["a", "b"])
+        results = await asyncio.gather(
+            call("POST", "/roulettes/a/pairs", {"seed": 0}),
+            call("POST", "/roulettes/a/participants", {"add": ["new"]}),
+            call("POST", "/roulettes/b/pairs", {"random_time": False}),
+            call("POST", "/roulettes/b/participants", {"remove": ["b1"]}),
+            call("GET", "/roulettes/a/participants"),
+        )
+        assert [status for status, _ in results] == [200] * 5
+        assert results[0][1]["pairs"] == 3
+
+        # reads do not wait for a running operation
+        async with service.locks["b"]:
+            status, _ = await asyncio.wait_for(
+                service.handle("GET", "/roulettes/b/participants"), 1
+            )
+            assert status == 200
+
+        # a failed operation leaves nothing behind for the next commit
+        def fail(roulette):
+            roulette.participants[99] = ("ghost", [])
+            roulette.mark_dirty("participants")
+            raise ValueError("failed")
+
+        with pytest.raises(ValueError):
+            await service._mutate("a", fail)
+        assert (await call("POST", "/roulettes/a/pairs", {"seed": 1}))[
+            0
+        ] == 200
+
+        status, last_round = await call("GET", "/roulettes/a/last-round")
+        assert status == 200 and len(last_round["pairs"]) == 3
+        status, participants = await call("GET", "/roulettes/a/participants")
+        assert len(participants) == 7
+        assert (await call("GET", "/roulettes/c/participants"))[0] == 404
+        assert (await call("POST", "/roulettes/a/pairs", {"x": 1}))[0] == 400
+        server.close()
+        await server.wait_closed()
+
+    asyncio.run(main())
+    # everything was flushed to the project directory
+    roulette = Roulette(tmp_path / "CoffeeRoulette-a" / "config.yaml")
+    assert len(roulette.participants) == 7
+    assert roulette.met.met_counts.sum() == 7 + 6 + 6
+    assert 99 not in roulette.participants
@@ -0,0 +1,33 @@
+import os
+import pickle
+from coffee_roulette import create_coffee_roulette, Roulette
+
+
+def make_roulette(tmp_path, n=6):
+    create_coffee_roulette(
+        "test",
+        working_dir=tmp_path,
+        participants=[f"p{i}" for i in range(n)],
+    )
+    return tmp_path / "CoffeeRoulette-test" / "config.yaml"
+
+
+def test_roulette_session_caches_and_commits(tmp_path):
+    cfg_path = make_roulette(tmp_path)
+    roulette = Roulette(cfg_path)
+    participants = roulette.participants
+    assert roulette.participants is participants
+
+    stats = roulette.get_pairs(random_time=False, seed=0)
+    assert stats.counters["pairs"] == 3
+    assert stats.counters["repeated_pairs"] == 0
+    assert {"load", "match", "save"} <= set(stats.phases)
+    assert roulette.met.unmet_counts().tolist() == [4] * 6
+    assert Roulette(cfg_path).met.unmet_counts().tolist() == [4] * 6
+
+    # files changed by someone else are picked up
+    participants_path = roulette.roulette_dir / "crParticipantDict.p"
+    with open(participants_path, "wb") as f:
+        pickle.dump({0: ("x", [])}, f)
+    os.utime(participants_path, ns=(0, 0))
+    assert roulette.participants == {0: ("x", [])}
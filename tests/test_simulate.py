@@ -0,0 +1,61 @@
+import numpy as np
+from coffee_roulette import create_coffee_roulette, Roulette
+from coffee_roulette import simulate_roulette, sweep_team_sizes, set_labels
+
+
+def test_simulate_roulette(tmp_path):
+    forecast = simulate_roulette(participants=9, trials=50, seed=0)
+    assert forecast.repeats.shape == (50, 9)
+    assert np.all(forecast.rounds_to_exhaustion <= 9)
+    # one sit-out per round with an odd number of participants
+    assert np.all(forecast.sitouts.sum(axis=1) == 9)
+
+    # the batched default forecasts what the maximum engine achieves
+    for n in [12, 21]:
+        batched = simulate_roulette(participants=n, trials=40, seed=1)
+        exact = simulate_roulette(
+            participants=n, trials=10, engine="maximum", seed=1
+        )
+        for key in ["exhaustion_mean", "repeats_mean"]:
+            assert abs(
+                batched.summary()[key] - exact.summary()[key]
+            ) <= 0.15 * max(exact.summary()[key], 1)
+
+    forecast = simulate_roulette(
+        participants=10, trials=20, changes={2: (4, 0), 4: (0, 3)}, seed=0
+    )
+    assert forecast.sitouts.shape == (20, 14)
+    # 11 people are left from round 4 on
+    assert np.all(forecast.sitouts.sum(axis=1) == 7)
+    summaries = sweep_team_sizes([4, 6], trials=10, seed=0)
+    assert set(summaries) == {4, 6}
+
+    create_coffee_roulette(
+        "sim",
+        working_dir=tmp_path,
+        participants=[f"p{i}" for i in range(6)],
+    )
+    cfg_path = tmp_path / "CoffeeRoulette-sim" / "config.yaml"
+    roulette = Roulette(cfg_path)
+    for seed in range(5):
+        roulette.get_pairs(random_time=False, seed=seed)
+    files = sorted(p.name for p in cfg_path.parent.iterdir())
+    forecast = simulate_roulette(cfg_path, trials=10, rounds=2, seed=0)
+    # everyone has met everyone: every simulated round repeats
+    assert np.all(forecast.rounds_to_exhaustion == 0)
+    assert sorted(p.name for p in cfg_path.parent.iterdir()) == files
+
+
+def test_forecast_respects_constraints(tmp_path):
+    create_coffee_roulette(
+        "c", working_dir=tmp_path, participants=[f"p{i}" for i in range(12)]
+    )
+    cfg_path = tmp_path / "CoffeeRoulette-c" / "config.yaml"
+    roulette = Roulette(cfg_path)
+    roulette.config["pairing_constraints"] = [{"different": "team"}]
+    roulette.mark_dirty("config")
+    set_labels(roulette, "team", {f"p{i}": i % 2 for i in range(12)})
+
+    # everyone can meet the 6 people of the other team only
+    forecast = simulate_roulette(roulette, trials=20, seed=0)
+    assert np.all(forecast.rounds_to_exhaustion <= 6)
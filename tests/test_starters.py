@@ -0,0 +1,21 @@
+from coffee_roulette.starters import ConversationStarters
+
+
+def test_assign_skips_used_starters():
+    participants = {
+        0: ("a", [0, 1]),
+        1: ("b", [2]),
+        2: ("c", []),
+        3: ("d", []),
+    }
+    starters = ConversationStarters(
+        ["q0\n", "q1\n", "q2\n", "q3\n"], participants
+    )
+
+    q_ids = starters.assign([0, 2], [1, 3], rng=0)
+    assert q_ids[0] == 3
+    assert participants[0][1] == [0, 1, 3] and participants[1][1] == [2, 3]
+    assert participants[2][1] == participants[3][1] == [q_ids[1]]
+
+    # every starter has now been used by a or b
+    assert starters.assign([0], [1], rng=0).tolist() == [-1]
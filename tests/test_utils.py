@@ -17,3 +17,23 @@ def test_get_meeting_times():
         dt.timedelta(seconds=55200),
         dt.timedelta(seconds=58200),
     ]
+
+
+def test_meeting_times_spread():
+    import datetime as dt
+    import numpy as np
+    from coffee_roulette.meeting_times import meeting_times
+
+    # Monday 2024-01-01 to Sunday 2024-01-07: five weekdays, two slots
+    calendar = meeting_times(dt.date(2024, 1, 1), 1, [[9, 10]], 30)
+    assert len(calendar.dates) == 5 and len(calendar.slots) == 2
+
+    date_ids, slot_ids = calendar.sample(25, rng=0, spread=True)
+    counts = np.bincount(date_ids * 2 + slot_ids, minlength=10)
+    assert counts.min() == 2 and counts.max() == 3
+    assert calendar.date_labels[0] == "Monday, January 01"
+    assert calendar.slot_labels == ["9:00", "9:30"]
+
+    date_ids, slot_ids = calendar.sample(0, rng=0, spread=True)
+    assert date_ids.shape == slot_ids.shape == (0,)
+    assert calendar.sample_labels(0, rng=0, spread=True) == []